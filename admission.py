@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from math import ceil
+
+from execution_pools import IO_POOL_SIZE
+
+# Requests processed at once. This is not a CPU limit: an admitted request spends
+# most of its 3-6 seconds waiting on Gemini, and its CPU work (embedding, Milvus
+# result handling, reranking) is already bounded by cpu_pool and the
+# micro-batchers. What runs out is io_pool: each request holds about two of its
+# threads at a time while its LLM stages run, so the default admits as many
+# requests as io_pool can serve. Admitting more would only make requests queue
+# inside the pool, eating into their stage budgets, instead of getting a 429.
+# Raise it together with IO_POOL_SIZE and LLM_MAX_CONCURRENCY.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(max(1, IO_POOL_SIZE // 2))))
+# Requests allowed to wait for a slot; anything beyond is rejected straight away
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+# Longest a queued request waits for a slot before it is rejected, in seconds
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionSlot:
+    """A granted slot; release() may be called any number of times, only the first counts."""
+
+    def __init__(self, controller, admitted_at):
+        self._controller = controller
+        self._admitted_at = admitted_at
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller.release(self._admitted_at)
+
+
+class AdmissionController:
+    """
+    Caps the number of requests in flight and the number waiting for a slot.
+    A request that finds the queue full, or waits longer than `queue_timeout`,
+    raises AdmissionRejected with a Retry-After estimate based on the average
+    time a request holds its slot.
+    """
+
+    def __init__(self, max_in_flight=ADMISSION_MAX_IN_FLIGHT, max_queue=ADMISSION_MAX_QUEUE, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = None
+        self._in_flight = 0
+        self._queued = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "total_queue_wait": 0.0, "total_service_time": 0.0, "completed": 0}
+
+    def retry_after(self) -> int:
+        with self._stats_lock:
+            avg_service = self._stats["total_service_time"] / self._stats["completed"] if self._stats["completed"] else 1.0
+        return max(1, ceil(avg_service * (self._queued + 1) / self.max_in_flight))
+
+    async def acquire(self) -> float:
+        """Waits for a slot and returns the time it was granted; pair with release()."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        queued_at = time.time()
+        if self._semaphore.locked():
+            if self._queued >= self.max_queue:
+                with self._stats_lock:
+                    self._stats["rejected_queue_full"] += 1
+                logging.warning(f"Admission queue full ({self._queued} waiting, {self._in_flight} in flight), rejecting request")
+                raise AdmissionRejected("Server is at capacity", self.retry_after())
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                with self._stats_lock:
+                    self._stats["rejected_timeout"] += 1
+                logging.warning(f"Request waited {self.queue_timeout} seconds for a slot, rejecting")
+                raise AdmissionRejected("Timed out waiting for capacity", self.retry_after())
+            finally:
+                self._queued -= 1
+        else:
+            await self._semaphore.acquire()
+        admitted_at = time.time()
+        self._in_flight += 1
+        with self._stats_lock:
+            self._stats["admitted"] += 1
+            self._stats["total_queue_wait"] += admitted_at - queued_at
+        return admitted_at
+
+    def release(self, admitted_at: float):
+        self._in_flight -= 1
+        self._semaphore.release()
+        with self._stats_lock:
+            self._stats["completed"] += 1
+            self._stats["total_service_time"] += time.time() - admitted_at
+
+    async def slot(self) -> AdmissionSlot:
+        """
+        Like acquire(), but returns an AdmissionSlot whose release() is
+        idempotent, for slots that several cleanup paths may try to free.
+        """
+        return AdmissionSlot(self, await self.acquire())
+
+    @asynccontextmanager
+    async def admit(self):
+        admitted_at = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["in_flight"] = self._in_flight
+        stats["queue_depth"] = self._queued
+        stats["max_in_flight"] = self.max_in_flight
+        stats["max_queue"] = self.max_queue
+        stats["avg_queue_wait"] = stats["total_queue_wait"] / stats["admitted"] if stats["admitted"] else 0.0
+        return stats
@@ -0,0 +1,91 @@
+"""
+Compares the per-bin and single-pass retrieval modes of the v6 server on
+latency and recall against the live Milvus collection.
+
+Usage:
+    python benchmark_retrieval.py [questions.txt] [--repeats N]
+
+Recall is the share of ids returned by the per-bin searches that the
+single-pass search also assigns to the same bin.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+import cpi_top5_results_v6_vm_experimental_citeurl as server
+from date_parser import parse_date_range
+from encoder import emb_text, model
+
+DEFAULT_QUESTIONS = [
+    "CPI inflation in India June 2025",
+    "Food inflation trend in India FY25",
+    "RBI monetary policy stance over the last two years",
+    "GDP growth of India FY 2023-24",
+    "IIP growth in India from April 2024 to March 2025",
+]
+
+
+def bins_for(question, min_months=3):
+    parsed = parse_date_range(question)
+    if parsed is None:
+        max_date = datetime.today().replace(day=1)
+        min_date = max_date - relativedelta(months=24)
+    else:
+        min_date, max_date = (datetime.strptime(d, "%B %Y") for d in parsed)
+    query_date = max_date.strftime("%B %Y")
+    query_duration = abs(server.months_since(min_date.strftime("%B %Y"), query_date))
+    if query_duration < min_months:
+        min_date = max_date - relativedelta(months=min_months)
+        query_duration = min_months
+    date_range = server.build_date_bins(min_date, max_date, query_duration, min_months)
+    return server.build_bin_ranges(date_range, query_date)
+
+
+def ids_per_bin(bin_searches):
+    return [{hit["id"] for hit in (search_res[0] if search_res else [])} for search_res, _ in bin_searches]
+
+
+async def run(questions, repeats):
+    latencies = {"per_bin": [], "single_pass": []}
+    recalls = []
+    for question in questions:
+        bin_ranges = bins_for(question)
+        bin_size = len(bin_ranges)
+        query_vector = emb_text(model, question)
+        for _ in range(repeats):
+            start = time.time()
+            per_bin = await server.search_bins(query_vector, [b["filter"] for b in bin_ranges], bin_size)
+            latencies["per_bin"].append(time.time() - start)
+
+            start = time.time()
+            single_pass = await server.search_single_pass(query_vector, bin_ranges, bin_size)
+            latencies["single_pass"].append(time.time() - start)
+
+        for expected, found in zip(ids_per_bin(per_bin), ids_per_bin(single_pass)):
+            if expected:
+                recalls.append(len(expected & found) / len(expected))
+        print(f"{question!r}: {bin_size} bins")
+
+    for mode, values in latencies.items():
+        values = np.array(values)
+        print(f"{mode:12s} p50 {np.percentile(values, 50):.4f}s  p95 {np.percentile(values, 95):.4f}s  mean {values.mean():.4f}s")
+    if recalls:
+        print(f"single_pass recall vs per_bin: mean {np.mean(recalls):.3f}, min {np.min(recalls):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", nargs="?", help="Text file with one question per line")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = DEFAULT_QUESTIONS
+    asyncio.run(run(questions, args.repeats))
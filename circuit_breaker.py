@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+
+class CircuitBreakerOpen(RuntimeError):
+    """Raised instead of calling a dependency while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of every attempt against a dependency over the last
+    `window` seconds and opens once at least `min_calls` attempts were made and
+    `failure_rate` of them failed. While open, check() raises CircuitBreakerOpen
+    and a background thread calls `probe` every `probe_interval` seconds; the
+    first probe that does not raise closes the breaker again.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], None], window: float = 30.0, min_calls: int = 10,
+                 failure_rate: float = 0.5, probe_interval: float = 30.0, error=CircuitBreakerOpen):
+        self.name = name
+        self.probe = probe
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.probe_interval = probe_interval
+        self.error = error
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_thread = None
+        self._stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def check(self, caller: str):
+        if self._opened_at is not None:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise self.error(f"{self.name} circuit breaker is open, not calling {caller}")
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def record_success(self):
+        now = time.time()
+        with self._lock:
+            if self._opened_at is not None:
+                logging.info(f"{self.name} circuit breaker closed after {now - self._opened_at:.1f} seconds")
+                self._opened_at = None
+                # Failures from before the outage must not reopen it right away
+                self._outcomes.clear()
+                self._failures = 0
+            self._outcomes.append((now, False))
+            self._trim(now)
+
+    def record_failure(self):
+        now = time.time()
+        with self._lock:
+            self._outcomes.append((now, True))
+            self._failures += 1
+            self._trim(now)
+            calls = len(self._outcomes)
+            if self._opened_at is not None or calls < self.min_calls or self._failures < self.failure_rate * calls:
+                return
+            self._opened_at = now
+            self._stats["opened"] += 1
+            logging.error(f"{self.name} circuit breaker opened after {self._failures} of {calls} attempts failed in {self.window:.0f} seconds")
+            if self._probe_thread is None or not self._probe_thread.is_alive():
+                self._probe_thread = threading.Thread(target=self._run_probe, name=f"{self.name}-breaker-probe", daemon=True)
+                self._probe_thread.start()
+
+    def _run_probe(self):
+        while self.is_open:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self._stats["probes"] += 1
+            try:
+                self.probe()
+            except Exception as e:
+                logging.warning(f"{self.name} recovery probe failed: {e}")
+                continue
+            self.record_success()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.time())
+            return {
+                **self._stats,
+                "open": self._opened_at is not None,
+                "open_for": time.time() - self._opened_at if self._opened_at is not None else 0.0,
+                "window_attempts": len(self._outcomes),
+                "window_failures": self._failures,
+            }
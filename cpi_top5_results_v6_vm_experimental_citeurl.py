@@ -1,17 +1,20 @@
+import asyncio
+import json
 import logging
+import weakref
 import time
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security.api_key import APIKeyHeader
 from pydantic import BaseModel
-from encoder import emb_text, model
-from milvus_utils_crossencoder_v6 import get_milvus_client, get_search_results, get_chunks_by_reference_page_pairs
+from embedding_service import encode_batch, embed_text, embed_texts, get_embedding_stats
+from milvus_utils_crossencoder_v6 import get_milvus_client, get_search_results, get_search_results_batch, get_chunks_by_reference_page_pairs, get_collection_version
 import os
 from dotenv import load_dotenv
-from sentence_transformers import CrossEncoder
 from dateutil.relativedelta import relativedelta
 from textwrap import dedent
-from google import genai
 from google.genai import types
 from   google.genai.types import Tool, GoogleSearch
 from time import strftime, gmtime
@@ -20,6 +23,20 @@ from typing import List, Dict
 from math import ceil
 import ast
 import numpy as np
+from stage_executor import Stage, run_stages
+from execution_pools import io_pool, run_io, run_cpu, shutdown_pools
+from llm_gateway import breaker, generate_content, generate_text, get_llm_metrics, llm_available
+from llm_cache import get_cache_stats
+from date_parser import parse_date_range
+from micro_batching import MicroBatcher
+from inference_backend import load_cross_encoder
+import encoder
+from resources import cached_resource, registry
+from admission import AdmissionController, AdmissionRejected
+from deadline import REQUEST_DEADLINE, Deadline, request_deadline
+from semantic_cache import SEMANTIC_CACHE_ENABLED, SemanticQueryCache
+from response_cache import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_VERSION_CHECK, ResponseCache
+from inference_workers import MODEL_HOSTING, embedder_process, reranker_process, shutdown_workers
 # Load environment variables
 load_dotenv()
 
@@ -27,7 +44,6 @@ load_dotenv()
 API_KEY = os.getenv("ACQ_API_KEY")
 API_KEY_NAME = "access_token"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 current_date = datetime.now().strftime('%Y-%m-%d')
 
 # FastAPI instance
@@ -38,13 +54,60 @@ CPI_V6_COLLECTION_NAME = os.getenv("CPI_V6_COLLECTION_NAME")
 MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
 TOP_N_RESULTS = 5  # Configurable number of search results
+# Resolve date ranges with the rule-based parser before falling back to fetch_date / fetch_min_date
+LOCAL_DATE_PARSER = os.getenv("LOCAL_DATE_PARSER", "1") == "1"
+# Rewrite, dates and key terms from a single structured-output call (plan_query)
+FUSED_PREPROCESSING = os.getenv("FUSED_PREPROCESSING", "0") == "1"
+# Maximum number of per-bin Milvus searches in flight for one request
+MILVUS_SEARCH_FANOUT = int(os.getenv("MILVUS_SEARCH_FANOUT", "4"))
+# "per_bin": one filtered search per date bin; "single_pass": one search over all bins, binned in process
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "per_bin")
+# Bins with fewer hits than this after a single-pass search get a filtered top-up search
+SINGLE_PASS_MIN_HITS = int(os.getenv("SINGLE_PASS_MIN_HITS", "5"))
+# Merge CrossEncoder pairs from concurrent requests into shared forward passes
+RERANK_BATCHING = os.getenv("RERANK_BATCHING", "1") == "1"
+RERANK_MAX_BATCH_SIZE = int(os.getenv("RERANK_MAX_BATCH_SIZE", "128"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+# Load the models and run dummy encode/predict/search calls before /ready reports healthy
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "10"))
+# Search the raw question over the default window while the LLM rewrite runs
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+SPECULATIVE_WINDOW_MONTHS = int(os.getenv("SPECULATIVE_WINDOW_MONTHS", "24"))
+SPECULATIVE_SEARCH_LIMIT = int(os.getenv("SPECULATIVE_SEARCH_LIMIT", "200"))
+# Largest number of questions accepted by /search-topN/batch in one request
+SEARCH_BATCH_MAX_QUESTIONS = int(os.getenv("SEARCH_BATCH_MAX_QUESTIONS", "500"))
+# Questions of one batch preprocessed at a time, leaving pool threads for interactive requests
+SEARCH_BATCH_PLAN_CONCURRENCY = int(os.getenv("SEARCH_BATCH_PLAN_CONCURRENCY", "4"))
+# Batches processed at once and batches allowed to wait; batches have their own admission queue
+SEARCH_BATCH_MAX_IN_FLIGHT = int(os.getenv("SEARCH_BATCH_MAX_IN_FLIGHT", "1"))
+SEARCH_BATCH_MAX_QUEUE = int(os.getenv("SEARCH_BATCH_MAX_QUEUE", "2"))
+# Default end-to-end budget of a batch in seconds, overridable with X-Request-Deadline
+SEARCH_BATCH_DEADLINE = float(os.getenv("SEARCH_BATCH_DEADLINE", "1800"))
 
 print(f'MILVUS_ENDPOINT = {MILVUS_ENDPOINT}')
 #cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2", device="cpu")
-cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L-2-v2", device="cpu")
-
-# Milvus client
-milvus_client = get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
+@cached_resource()
+def get_cross_encoder():
+    # Loaded on first use, or by the startup warm-up alongside the embedder
+    return load_cross_encoder()  # ms-marco-TinyBERT-L-2-v2 on the configured INFERENCE_BACKEND
+
+if MODEL_HOSTING == "process":
+    # The CrossEncoder lives in its own worker process, see inference_workers
+    rerank_predict = reranker_process
+else:
+    def rerank_predict(pairs):
+        return get_cross_encoder().predict(pairs)
+rerank_batcher = MicroBatcher("cross_encoder", rerank_predict, RERANK_MAX_BATCH_SIZE, RERANK_MAX_WAIT_MS)
+
+# Milvus client, connected on first use so a Milvus outage keeps /ready false
+# instead of failing the import
+def milvus():
+    return get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
+
+async def run_milvus(fn, *args, **kwargs):
+    """Runs fn(client, *args, **kwargs) on the I/O pool, connecting there if needed."""
+    return await run_io(lambda: fn(milvus(), *args, **kwargs))
 
 # Logging setup
 logging.basicConfig(
@@ -53,6 +116,98 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+# Set once warm-up has finished; /ready reports it
+readiness = {"ready": False, "error": None, "timings": {}}
+
+async def timed(name, fn, *args, **kwargs):
+    stage_start = time.time()
+    result = await fn(*args, **kwargs)
+    readiness["timings"][name] = round(time.time() - stage_start, 4)
+    logging.info(f"Warm-up {name} took {time.time() - stage_start:.4f} seconds")
+    return result
+
+async def warm_up():
+    """
+    Loads the embedder and CrossEncoder in parallel (or starts their worker
+    processes), then runs one dummy encode, predict and Milvus search so that
+    tokenizers, first-call overhead and collection loading are paid before any
+    real request. Retries until it succeeds.
+    """
+    while True:
+        warmup_start = time.time()
+        try:
+            if MODEL_HOSTING == "process":
+                await asyncio.gather(
+                    timed("load_embedder", run_io, embedder_process.start),
+                    timed("load_reranker", run_io, reranker_process.start),
+                )
+            else:
+                await asyncio.gather(
+                    timed("load_embedder", run_io, lambda: encoder.model),
+                    timed("load_reranker", run_io, get_cross_encoder),
+                )
+            await timed("connect_milvus", run_io, milvus)
+            if WARMUP_ENABLED:
+                query_vector = (await timed("encode", run_cpu, encode_batch, ["What was CPI inflation in India last month?"]))[0]
+                await timed("predict", run_cpu, rerank_predict, [("What was CPI inflation in India last month?", "CPI inflation eased to 2.1 per cent.")])
+                await timed("load_collection", run_milvus, lambda client: client.load_collection(CPI_V6_COLLECTION_NAME))
+                await timed("search", run_milvus, get_search_results, CPI_V6_COLLECTION_NAME, query_vector, ["id"], None, 1, limit=1)
+            readiness["ready"] = True
+            readiness["error"] = None
+            logging.info(f"Warm-up finished in {time.time() - warmup_start:.4f} seconds, server is ready")
+            return
+        except Exception as e:
+            readiness["error"] = str(e)
+            logging.error(f"Warm-up failed, retrying in {WARMUP_RETRY_DELAY} seconds: {e}", exc_info=True)
+            await asyncio.sleep(WARMUP_RETRY_DELAY)
+
+@app.on_event("startup")
+async def start_warm_up():
+    # In the background, so /live answers while the models load
+    asyncio.get_running_loop().create_task(warm_up())
+
+@app.get("/live")
+async def live():
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def ready():
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **readiness})
+    return {"status": "ready", **readiness}
+
+# Caps concurrent search requests; excess requests get a fast 429
+admission = AdmissionController()
+# Batches queue separately so a long batch never takes an interactive request's slot
+batch_admission = AdmissionController(SEARCH_BATCH_MAX_IN_FLIGHT, SEARCH_BATCH_MAX_QUEUE)
+
+def reject(e: AdmissionRejected):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+# Full /search-topN responses keyed by normalized question
+response_cache = ResponseCache()
+# Preprocessing results of earlier questions, looked up by raw question embedding
+semantic_cache = SemanticQueryCache()
+
+async def watch_collection_version():
+    while True:
+        try:
+            response_cache.set_version(await run_milvus(get_collection_version, CPI_V6_COLLECTION_NAME))
+        except Exception as e:
+            logging.warning(f"Could not read version of collection {CPI_V6_COLLECTION_NAME}: {e}")
+        await asyncio.sleep(RESPONSE_CACHE_VERSION_CHECK)
+
+@app.on_event("startup")
+async def start_response_cache():
+    if RESPONSE_CACHE_ENABLED:
+        asyncio.get_running_loop().create_task(watch_collection_version())
+
+@app.on_event("shutdown")
+def release_pools():
+    shutdown_pools(wait=False)
+    shutdown_workers()
+    registry.shutdown()
+
 # API Key verification dependency
 async def verify_api_key(api_key: str = Depends(api_key_header)):
     logging.info(f"Received API Key: {api_key[:4]}****")  # Mask API key for security
@@ -65,13 +220,23 @@ async def verify_api_key(api_key: str = Depends(api_key_header)):
 class Question(BaseModel):
     question: str
 
+class QuestionBatch(BaseModel):
+    questions: List[str]
+
+# Structured output of plan_query
+class QueryPlan(BaseModel):
+    rephrased_query: str
+    min_date: str
+    max_date: str
+    key_terms: List[str] = []
+
 def clarify_query(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
     curdate = strftime("%Y-%m", gmtime())
     google_search_tool = Tool(
         google_search = GoogleSearch()
     )
-    response = client.models.generate_content(
+    response = generate_text(
+        name="clarify_query",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent(f"""You are tasked with rephrasing the given query to make it easier for a RAG agent to pull the right data.
@@ -104,17 +269,18 @@ def clarify_query(query):
             tools=[google_search_tool],
             temperature=0.0,
             ),
-        contents=query
+        contents=query,
+        cache=True,
     )
 
-    return response.text
+    return response
 
 def answer_query(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
     google_search_tool = Tool(
         google_search = GoogleSearch()
     )
-    response = client.models.generate_content(
+    response = generate_content(
+        name="answer_query",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent("""Answer the following query by relying on a web search. Restrict your answer to 50 words, and emphasise results within the date range specified.
@@ -129,11 +295,11 @@ def answer_query(query):
 
 
 def final_query(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
     google_search_tool = Tool(
         google_search = GoogleSearch()
     )
-    response = client.models.generate_content(
+    response = generate_content(
+        name="final_query",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent("""Consider the following query and a suggested answer. Generate a single re-worded query for RAG retrieval, which emphasises key quantities at the start (e.g. Specific answer to the query) and also attempts to contrast with general responses.
@@ -150,8 +316,8 @@ def final_query(query):
 
 def identify_lexical_term(query):
     try:
-        client = genai.Client(api_key=GOOGLE_API_KEY)
-        response = client.models.generate_content(
+        response = generate_text(
+            name="identify_lexical_term",
             model="gemini-2.0-flash",
             config=types.GenerateContentConfig(
                 system_instruction=dedent("""Extract a MAXIMUM of FOUR (4) key entity /entities from the statement below, which can be used for lexical matching in proposed answers. It/they should be state names, categories of product, macro-economic indicators (GDP, GVA, etc.), or sectors (agriculture, mining, etc.). 
@@ -167,9 +333,10 @@ def identify_lexical_term(query):
                 """),
                 temperature=0.0,
                 ),
-            contents=query
+            contents=query,
+            cache=True,
         )
-        response = ast.literal_eval(response.text)
+        response = ast.literal_eval(response)
         logging.info("Identified key terms: " + str(response))
         return response
     except:
@@ -177,9 +344,9 @@ def identify_lexical_term(query):
     return []
 
 def fetch_date(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
     curdate = strftime("%Y-%m", gmtime())
-    response = client.models.generate_content(
+    response = generate_text(
+        name="fetch_date",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent(f"""You are a date extractor. Your job is to extract a clear time reference point in time from user queries, if one exists.
@@ -197,16 +364,17 @@ def fetch_date(query):
             """),
             temperature=0.0,
         ),
-        contents=query
+        contents=query,
+        cache=True,
     )
 
-    query_date = response.text.strip()
+    query_date = response.strip()
     return query_date
 
 def fetch_min_date(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
     curdate = strftime("%Y-%m", gmtime())
-    response = client.models.generate_content(
+    response = generate_text(
+        name="fetch_min_date",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent(f"""You are a date extractor. Your job is to extract a clear time reference point in time from user queries, if one exists.
@@ -224,12 +392,80 @@ def fetch_min_date(query):
             """),
             temperature=0.0,
         ),
-        contents=query
+        contents=query,
+        cache=True,
     )
 
-    query_date = response.text.strip()
+    query_date = response.strip()
     return query_date
 
+def plan_query(query):
+    """
+    Fused replacement for clarify_query, fetch_date, fetch_min_date and
+    identify_lexical_term. Structured output cannot be combined with the
+    GoogleSearch tool, so the rewrite is not web-grounded in this mode.
+    """
+    curdate = strftime("%Y-%m", gmtime())
+    response = generate_text(
+        name="plan_query",
+        model="gemini-2.0-flash",
+        config=types.GenerateContentConfig(
+            system_instruction=dedent(f"""You are preparing a query for a RAG agent. Remember that the current date is {curdate}. Produce the following fields.
+                rephrased_query:
+                    1. Do not edit the query as far as possible, only augment with a date range if none is present.
+                        a. If no date range is available from the context, use one year before {curdate} to {curdate}.
+                        b. If financial year or FY is mentioned, it is April of the previous year to March of the mentioned year.
+                            Example: FY25 -> April 2024 to March 2025
+                                     FY23-24 -> April 2023 to March 2024
+                                     FY 2025-26 -> April 2025 to March 2026
+                    2. If the query contains acronyms, include full form in parentheses.
+                    3. Always use month names and full years (e.g. April 2025, January 2022).
+                    4. If the query does not mention "India", mention it explicitly.
+                    5. Include synonyms and related quantities in the query.
+                        Example: "Top 5 states by GDP" -> "Top 5 states by GDP, GVA, GSVA, GSDP, NSDP"
+                    6. You MUST restrict the rephrased query to at most 25 words.
+                min_date: the EARLIEST date of the rephrased query's date range, formatted as "%B %Y" (e.g. "April 2024").
+                max_date: the LATEST date of the rephrased query's date range, formatted as "%B %Y". Do not output a date beyond {curdate}.
+                    Example: "What happened in Q3 2022?" -> min_date "October 2022", max_date "December 2022"
+                    Example: "What was the inflation rate H1 FY25?" -> min_date "April 2024", max_date "September 2024"
+                key_terms: a MAXIMUM of FOUR (4) key entities for lexical matching in proposed answers. They should be state names, categories of product, macro-economic indicators (GDP, GVA, etc.), or sectors (agriculture, mining, etc.).
+                    For example, "Impact of startups" --> ["startups"]
+                    For example, "Economy of Uttar Pradesh" --> ["Uttar Pradesh"]
+
+            The original query is given below.
+            """),
+            response_mime_type="application/json",
+            response_schema=QueryPlan,
+            temperature=0.0,
+            ),
+        contents=query,
+        cache=True,
+    )
+    plan = QueryPlan.model_validate_json(response)
+    # Reject malformed dates here so the caller falls back to the separate helpers
+    datetime.strptime(plan.min_date, "%B %Y")
+    datetime.strptime(plan.max_date, "%B %Y")
+    plan.key_terms = plan.key_terms[:4]
+    logging.info(f"Query plan: {plan}")
+    return plan
+
+def parse_query_dates(query):
+    """Local (min_date, max_date) for the query, or None when Gemini has to resolve it."""
+    parsed = parse_date_range(query) if LOCAL_DATE_PARSER else None
+    if parsed is not None:
+        logging.info(f"Local date parser resolved {parsed[0]} to {parsed[1]}")
+    return parsed
+
+def resolve_query_date(query, parsed):
+    if parsed is None:
+        return fetch_date(query)
+    return parsed[1]
+
+def resolve_query_min_date(query, parsed):
+    if parsed is None:
+        return fetch_min_date(query)
+    return parsed[0]
+
 
 def months_since(date_str, query_date='today'):
     #Date from the query if not use latest
@@ -293,11 +529,41 @@ def build_range_around_date(center_date_str, months_before, months_after, field_
     filters = [f'{field_name} == "{m}"' for m in months]
     filter_expr = " or ".join(filters)
 
-    return {"filter": filter_expr}
+    return {"filter": filter_expr, "months": months}
+
+def build_date_bins(min_date, max_date, query_duration, min_months):
+    """
+    Splits the query window into (start, end) date bins, plus bins around and
+    after max_date so documents published after the period are also searched.
+    """
+    if query_duration <= min_months:
+        date_range = [(min_date, max_date), (max_date + relativedelta(months=1), max_date + relativedelta(months=min_months))]
+    else:
+        bin_size = min(4,max(2,query_duration // 12))
+        step = max(1, ceil(query_duration // bin_size))
+        date_range = []
+        cur_date = min_date
+        while cur_date < max_date:
+            next_chunk = min(cur_date + relativedelta(months=step), max_date)
+            date_range.append((cur_date, next_chunk))
+            cur_date = next_chunk + relativedelta(months=1)
+        date_range.append((max_date - relativedelta(months=2), max_date + relativedelta(months=2)))
+        if (step > 3) and (query_duration >= 18):
+            date_range.append((max_date + relativedelta(months=3), max_date + relativedelta(months=step)))
+    return date_range
+
+def build_bin_ranges(date_range, query_date):
+    """Milvus filter and month list for every date bin."""
+    bin_ranges = []
+    for start_date, end_date in date_range:
+        months_before = (months_since(start_date.strftime("%B %Y"), query_date))
+        months_after = (months_since(query_date, end_date.strftime("%B %Y")))
+        bin_ranges.append(build_range_around_date(query_date, months_before, months_after))
+    return bin_ranges
 
 def generalize_query(query):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    response = client.models.generate_content(
+    response = generate_content(
+        name="generalize_query",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent("""Consider the query given in the content. Your task is to generalize the query to a small extent. You can do this by:
@@ -315,8 +581,8 @@ def generalize_query(query):
     return response.text
 
 def suggest_answer(query, excerpts):
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    response = client.models.generate_content(
+    response = generate_content(
+        name="suggest_answer",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent(f"""Consider the following query: {query}. You are given the following content that contains a potential answer for this query. Write a short paragraph or set of bullet points that summarize the answer to the query.
@@ -719,8 +985,8 @@ def synthesize_with_gemini(
         )
 
     # System instruction prompt without structured data logic
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    response = client.models.generate_content(
+    response = generate_content(
+        name="synthesize_with_gemini",
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction=dedent(f"""Based on the original question: {question}, and the following unstructured text data from various sources, synthesize a comprehensive and coherent answer. Integrate the information smoothly.
@@ -750,33 +1016,375 @@ def synthesize_with_gemini(
     return response.text
 
 
-# Search API Endpoint
-@app.post("/search-topN", dependencies=[Depends(verify_api_key)])
-async def search_topN_milvus(request: Request, question: Question):
-    bin_size   =  2
-    top_k      =  6
-    min_months =  3
+async def preprocess_question(question_text, deadline=None):
+    """
+    Runs the Gemini preprocessing for a question and returns llm_query,
+    suggest_answer, query_date, query_min_date, key_terms and skipped_stages.
+    Date stages may resolve to None, in which case the caller uses its default
+    window.
+
+    With a deadline, every stage gets its share of the budget. If clarify_query
+    runs out of time the raw question is used as the rewrite. If answer_query
+    runs out, there is no suggested answer and no key terms, so no lexical
+    boosts. Both are listed in skipped_stages.
+    """
+    def budget(name):
+        return deadline.budget(name) if deadline is not None else None
+
+    expires_at = deadline.expires_at if deadline is not None else None
+    if FUSED_PREPROCESSING:
+        preprocessed = await run_stages([
+            Stage("plan", lambda: plan_query(question_text), optional=True, timeout=budget("plan")),
+            Stage("suggest_answer", lambda plan: answer_query(plan.rephrased_query.strip()).strip(), deps=("plan",), optional=True, timeout=budget("suggest_answer")),
+        ], executor=io_pool, deadline=expires_at)
+        plan = preprocessed["plan"]
+        if plan is not None:
+            return {
+                "llm_query": plan.rephrased_query.strip(),
+                "suggest_answer": preprocessed["suggest_answer"] or "",
+                "query_date": plan.max_date,
+                "query_min_date": plan.min_date,
+                "key_terms": plan.key_terms if preprocessed["suggest_answer"] is not None else [],
+                "skipped_stages": sorted(preprocessed.skipped),
+            }
+        logging.warning("Fused preprocessing failed, falling back to separate LLM calls")
+
+    # answer_query and both date extractors only need the rephrased query, so they
+    # run concurrently once clarify_query returns. The local date parser runs once
+    # for both date stages.
+    preprocessed = await run_stages([
+        Stage("llm_query", lambda: clarify_query(question_text).strip(), timeout=budget("llm_query"), fallback=lambda: question_text.strip()),
+        Stage("suggest_answer", lambda llm_query: answer_query(llm_query).strip(), deps=("llm_query",), optional=True, timeout=budget("suggest_answer")),
+        Stage("parsed_dates", parse_query_dates, deps=("llm_query",), optional=True),
+        Stage("query_date", resolve_query_date, deps=("llm_query", "parsed_dates"), optional=True, timeout=budget("query_date")),
+        Stage("query_min_date", resolve_query_min_date, deps=("llm_query", "parsed_dates"), optional=True, timeout=budget("query_min_date")),
+        Stage("key_terms", identify_lexical_term, deps=("suggest_answer",), optional=True, timeout=budget("key_terms")),
+    ], executor=io_pool, deadline=expires_at)
+    return {
+        "llm_query": preprocessed["llm_query"],
+        "suggest_answer": preprocessed["suggest_answer"] or "",
+        "query_date": preprocessed["query_date"],
+        "query_min_date": preprocessed["query_min_date"],
+        "key_terms": preprocessed["key_terms"] or [],
+        "skipped_stages": sorted(preprocessed.skipped),
+    }
+
+
+def degraded_preprocess(question_text):
+    """
+    LLM-free preprocessing used while the LLM circuit breaker is open: the raw
+    question is embedded and reranked as is, the date window comes from the
+    local parser (or the default window) and there are no key terms.
+    """
+    parsed = parse_date_range(question_text)
+    query_min_date, query_date = parsed if parsed is not None else (None, None)
+    return {
+        "llm_query": question_text.strip(),
+        "suggest_answer": "",
+        "query_date": query_date,
+        "query_min_date": query_min_date,
+        "key_terms": [],
+        "skipped_stages": ["key_terms", "llm_query", "query_date", "query_min_date", "suggest_answer"],
+        "degraded": True,
+    }
+
+
+async def preprocess_question_cached(question_text, deadline=None):
+    """
+    preprocess_question, reusing the result of a near-duplicate earlier question
+    when the semantic cache is enabled. Results with skipped stages are not cached.
+    While the LLM circuit breaker is open, degraded_preprocess is used instead.
+    """
+    if not llm_available():
+        logging.warning(f"LLM circuit breaker open, degraded preprocessing for: {question_text}")
+        return degraded_preprocess(question_text)
+    if not SEMANTIC_CACHE_ENABLED:
+        return await preprocess_question(question_text, deadline)
+    question_vector = await embed_text(question_text)
+    preprocessed = semantic_cache.lookup(question_text, question_vector)
+    if preprocessed is None:
+        preprocessed = await preprocess_question(question_text, deadline)
+        if not preprocessed["skipped_stages"]:
+            semantic_cache.add(question_text, question_vector, preprocessed)
+    return preprocessed
+
+
+async def _search_bin(query_vector, date_filter, bin_size, semaphore):
+    async with semaphore:
+        search_start = time.time()
+        search_res = await run_milvus(
+            get_search_results,
+            CPI_V6_COLLECTION_NAME, query_vector, ["content", "source", "id", "page", "reference", "date"],
+            date_filter, bin_size
+        )
+        return search_res, time.time() - search_start
+
+
+async def search_bins(query_vector, date_filters, bin_size):
+    """
+    Runs one filtered Milvus search per date bin, at most MILVUS_SEARCH_FANOUT at a
+    time, and returns (search_res, search_time) pairs in bin order.
+    """
+    semaphore = asyncio.Semaphore(MILVUS_SEARCH_FANOUT)
+    return await asyncio.gather(*(_search_bin(query_vector, date_filter, bin_size, semaphore) for date_filter in date_filters))
+
+
+async def retrieve_bins(query_vector, bin_ranges, bin_size):
+    """Searches every date bin with the configured RETRIEVAL_MODE."""
+    fanout_start = time.time()
+    if RETRIEVAL_MODE == "single_pass":
+        bin_searches = await search_single_pass(query_vector, bin_ranges, bin_size)
+    else:
+        bin_searches = await search_bins(query_vector, [bin_range["filter"] for bin_range in bin_ranges], bin_size)
+    logging.info(f"Milvus {RETRIEVAL_MODE} retrieval over {len(bin_ranges)} bins took {time.time() - fanout_start:.4f} seconds")
+    return bin_searches
+
+
+async def iter_bin_searches(query_vector, bin_ranges, bin_size):
+    """
+    Like retrieve_bins, but yields each bin's (search_res, search_time) as soon as
+    it and every earlier bin have finished, so callers can process bins in order
+    while later searches are still running.
+    """
+    if RETRIEVAL_MODE == "single_pass":
+        for bin_search in await search_single_pass(query_vector, bin_ranges, bin_size):
+            yield bin_search
+        return
+    semaphore = asyncio.Semaphore(MILVUS_SEARCH_FANOUT)
+    tasks = [
+        asyncio.ensure_future(_search_bin(query_vector, bin_range["filter"], bin_size, semaphore))
+        for bin_range in bin_ranges
+    ]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def search_bins_batch(query_vectors, bin_ranges_per_query):
+    """
+    search_bins for several queries. Bins with the same date filter and bin count
+    are searched for all of their queries in one Milvus request. Returns, per
+    query, (search_res, search_time) pairs in bin order.
+    """
+    groups = {}
+    for query_index, bin_ranges in enumerate(bin_ranges_per_query):
+        for bin_index, bin_range in enumerate(bin_ranges):
+            key = (bin_range["filter"], len(bin_ranges))
+            groups.setdefault(key, []).append((query_index, bin_index))
+
+    semaphore = asyncio.Semaphore(MILVUS_SEARCH_FANOUT)
+
+    async def search(date_filter, bin_size, members):
+        async with semaphore:
+            search_start = time.time()
+            search_res = await run_milvus(
+                get_search_results_batch,
+                CPI_V6_COLLECTION_NAME, [query_vectors[query_index] for query_index, _ in members],
+                ["content", "source", "id", "page", "reference", "date"], date_filter, bin_size
+            )
+            return search_res, time.time() - search_start
+
+    fanout_start = time.time()
+    group_results = await asyncio.gather(*(search(date_filter, bin_size, members) for (date_filter, bin_size), members in groups.items()))
+    logging.info(f"Milvus batch retrieval: {sum(len(b) for b in bin_ranges_per_query)} bins in {len(groups)} searches took {time.time() - fanout_start:.4f} seconds")
+
+    results = [[None] * len(bin_ranges) for bin_ranges in bin_ranges_per_query]
+    for members, (search_res, search_time) in zip(groups.values(), group_results):
+        for (query_index, bin_index), hits in zip(members, search_res):
+            results[query_index][bin_index] = ([hits], search_time)
+    return results
+
+
+def rerank_pairs(query_text, items):
+    """Unique (id, item) entries and the CrossEncoder pairs to score them with."""
+    unique = {}
+    for item in items:
+        unique.setdefault(item["id"], item)
+    pairs = [(query_text, str(item["content"]) + "\n\nResult from " + str(item["reference"]) + ", " + str(item['date'])) for item in unique.values()]
+    return list(unique.keys()), pairs
 
-    start_time = time.time()
-    request_time = datetime.utcnow().isoformat()
 
-    llm_query = clarify_query(question.question).strip()
+async def score_pairs(pairs):
+    if RERANK_BATCHING:
+        return await rerank_batcher.submit(pairs)
+    return await run_cpu(rerank_predict, pairs)
+
+
+async def cross_encode(query_text, items):
+    """
+    Scores items against the query with the CrossEncoder in a single batched
+    predict call. Items repeated across date bins are scored once. Returns a
+    dictionary mapping item id to raw score.
+    """
+    ids, pairs = rerank_pairs(query_text, items)
+    if not pairs:
+        return {}
+    scores = await score_pairs(pairs)
+    return dict(zip(ids, scores))
+
+
+async def cross_encode_many(queries):
+    """
+    cross_encode for several (query_text, items) at once: every pair goes into
+    one predict call. Returns one id -> score dictionary per query.
+    """
+    prepared = [rerank_pairs(query_text, items) for query_text, items in queries]
+    all_pairs = [pair for _, pairs in prepared for pair in pairs]
+    if not all_pairs:
+        return [{} for _ in prepared]
+    scores = list(await score_pairs(all_pairs))
+    results = []
+    offset = 0
+    for ids, pairs in prepared:
+        results.append(dict(zip(ids, scores[offset:offset + len(pairs)])))
+        offset += len(pairs)
+    return results
+
+
+def assign_hits_to_bins(hits, bin_ranges, bin_size):
+    """
+    Distributes hits from one wide search, best first, into the bins whose months
+    contain their date, mirroring the per-bin search: at most 4 hits per
+    reference and max(10, 30 - 5*bin_size) references per bin.
+    """
+    per_bin_limit = max(10, 30 - 5*bin_size)
+    assigned = []
+    for bin_range in bin_ranges:
+        months = set(bin_range["months"])
+        bin_hits = []
+        per_reference = {}
+        for hit in hits:
+            reference = hit["entity"]["reference"]
+            if hit["entity"]["date"] not in months:
+                continue
+            if reference not in per_reference and len(per_reference) >= per_bin_limit:
+                continue
+            if per_reference.get(reference, 0) >= 4:
+                continue
+            per_reference[reference] = per_reference.get(reference, 0) + 1
+            bin_hits.append(hit)
+        assigned.append(bin_hits)
+    return assigned
+
+
+async def search_single_pass(query_vector, bin_ranges, bin_size):
+    """
+    Alternative to search_bins: one search over the union of all bin months with
+    a proportionally larger limit, with hits assigned to bins by their date field.
+    Bins left with fewer than SINGLE_PASS_MIN_HITS hits get their own filtered
+    top-up search. Returns (search_res, search_time) pairs in bin order, in the
+    same shape as search_bins.
+    """
+    per_bin_limit = max(10, 30 - 5*bin_size)
+    union_months = sorted({m for bin_range in bin_ranges for m in bin_range["months"]}, key=lambda m: datetime.strptime(m, "%B %Y"))
+    union_filter = " or ".join(f'date == "{m}"' for m in union_months)
+
+    search_start = time.time()
+    search_res = await run_milvus(
+        get_search_results,
+        CPI_V6_COLLECTION_NAME, query_vector, ["content", "source", "id", "page", "reference", "date"],
+        union_filter, bin_size, limit=min(16384, per_bin_limit * len(bin_ranges))
+    )
+    logging.info(f"Single-pass Milvus search over {len(union_months)} months took {time.time() - search_start:.4f} seconds")
+    hits = sorted(search_res[0] if search_res else [], key=lambda hit: hit["distance"], reverse=True)
+
+    bin_searches = []
+    short_bins = []
+    for index, bin_hits in enumerate(assign_hits_to_bins(hits, bin_ranges, bin_size)):
+        bin_searches.append(([bin_hits], 0.0))
+        if len(bin_hits) < SINGLE_PASS_MIN_HITS:
+            short_bins.append(index)
+
+    if short_bins:
+        logging.info(f"Topping up {len(short_bins)} short bins with filtered searches")
+        top_ups = await search_bins(query_vector, [bin_ranges[index]["filter"] for index in short_bins], bin_size)
+        for index, top_up in zip(short_bins, top_ups):
+            bin_searches[index] = top_up
+    return bin_searches
+
+
+async def speculate(question_text):
+    """
+    Speculative retrieval for the raw question, started before preprocessing:
+    one Milvus search over the last SPECULATIVE_WINDOW_MONTHS months. Hits are
+    only scored once use_speculation has accepted them, against the same
+    rerank text as every other bin.
+    """
+    speculation_start = time.time()
+    window = build_range_around_date(datetime.today().strftime("%B %Y"), SPECULATIVE_WINDOW_MONTHS, 0)
+    query_vector = await embed_text(question_text)
+    search_res = await run_milvus(
+        get_search_results,
+        CPI_V6_COLLECTION_NAME, query_vector, ["content", "source", "id", "page", "reference", "date"],
+        window["filter"], 1, limit=SPECULATIVE_SEARCH_LIMIT
+    )
+    hits = sorted(search_res[0] if search_res else [], key=lambda hit: hit["distance"], reverse=True)
+    logging.info(f"Speculative retrieval of {len(hits)} hits took {time.time() - speculation_start:.4f} seconds")
+    return {"months": set(window["months"]), "hits": hits}
+
+
+async def use_speculation(speculation, bin_ranges, bin_size):
+    """
+    Bins that lie inside the speculative window and received at least
+    SINGLE_PASS_MIN_HITS speculative hits are seeded from them, so they need no
+    Milvus search of their own. Returns a {bin index: (search_res, search_time)}
+    mapping of the seeded bins, empty if the speculation failed.
+    """
+    if speculation is None:
+        return {}
+    try:
+        result = await speculation
+    except Exception as e:
+        logging.warning(f"Speculative retrieval failed, using the normal flow: {e}")
+        return {}
+    seeded = {}
+    for index, (bin_range, bin_hits) in enumerate(zip(bin_ranges, assign_hits_to_bins(result["hits"], bin_ranges, bin_size))):
+        if set(bin_range["months"]) <= result["months"] and len(bin_hits) >= SINGLE_PASS_MIN_HITS:
+            seeded[index] = ([bin_hits], 0.0)
+    logging.info(f"Speculative retrieval seeded {len(seeded)} of {len(bin_ranges)} bins")
+    return seeded
+
+
+@app.get("/metrics", dependencies=[Depends(verify_api_key)])
+async def get_metrics():
+    return {
+        "llm": get_llm_metrics(),
+        "llm_breaker": breaker.stats(),
+        "admission": admission.stats(),
+        "batch_admission": batch_admission.stats(),
+        "resources": registry.stats(),
+        "llm_cache": get_cache_stats(),
+        "rerank_batcher": rerank_batcher.stats(),
+        "embedder": get_embedding_stats(),
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+    }
+
+async def plan_retrieval(question_text, min_months=3, deadline=None):
+    """
+    Preprocesses the question and works out its date window and date bins.
+    """
+    preprocessed = await preprocess_question_cached(question_text, deadline)
+    llm_query = preprocessed["llm_query"]
     #llm_query = (llm_query + "\n" + answer_query(llm_query).strip())
     #llm_query = final_query(llm_query).strip()
     #llm_query = (question.question).strip()
-    suggest_answer = answer_query(llm_query).strip()
+    suggest_answer = preprocessed["suggest_answer"]
 
     try:
-        query_date = fetch_date(llm_query).strip()
+        query_date = preprocessed["query_date"].strip()
         if query_date == 'today':
             query_date = datetime.today().strftime("%B %Y")
-        query_min_date = fetch_min_date(llm_query).strip()
+        query_min_date = preprocessed["query_min_date"].strip()
         if query_min_date == 'today':
             query_min_date = datetime.today().strftime("%B %Y")
         query_duration = abs(months_since(query_min_date,query_date))
         logging.info(f"Query min date: {query_min_date}, max date: {query_date}, Query duration is {query_duration}")
     except:
-        query_date = 'today'
+        query_date = datetime.today().strftime("%B %Y")
         query_duration = 24
         query_min_date = (datetime.today() - relativedelta(months=query_duration)).strftime("%B %Y")
     if query_duration < min_months:
@@ -785,29 +1393,11 @@ async def search_topN_milvus(request: Request, question: Question):
     min_date = datetime.strptime(query_min_date, "%B %Y")
     max_date = datetime.strptime(query_date, "%B %Y")
 
-    client_ip = request.client.host  # Get client IP address
-
-    logging.info(f"Received request from {client_ip} at {request_time}")
-    logging.info(f"Question Asked: {question.question}")
+    logging.info(f"Question Asked: {question_text}")
     logging.info(f"LLM Query Generated: {llm_query}")
     logging.info("Reference answer: " + suggest_answer)
-    key_terms = identify_lexical_term(suggest_answer)
 
-    if query_duration <= min_months:
-        date_range = [(min_date, max_date), (max_date + relativedelta(months=1), max_date + relativedelta(months=min_months))]
-    else:
-        bin_size = min(4,max(2,query_duration // 12))
-        step = max(1, ceil(query_duration // bin_size))
-        date_range = []
-        cur_date = min_date
-        while cur_date < max_date:
-            next_chunk = min(cur_date + relativedelta(months=step), max_date)
-            date_range.append((cur_date, next_chunk))
-            cur_date = next_chunk + relativedelta(months=1)
-        date_range.append((max_date - relativedelta(months=2), max_date + relativedelta(months=2)))
-        if (step > 3) and (query_duration >= 18):
-            date_range.append((max_date + relativedelta(months=3), max_date + relativedelta(months=step)))
-    bin_size = len(date_range)
+    date_range = build_date_bins(min_date, max_date, query_duration, min_months)
 
     logging.info(
         f"""Overall date_filter: Min Date: {min_date.strftime("%B %Y")}, Max Date: {max_date.strftime("%B %Y")}, Total Months: {query_duration}"""
@@ -815,314 +1405,577 @@ async def search_topN_milvus(request: Request, question: Question):
 
     logging.info(f"Date Range tuples: {date_range}")
 
-    try:
-        # Track token count
-        token_count = len(question.question.split())  # Approximate token count
-        logging.info(f"Question Token Count: {token_count}")
+    return {
+        "llm_query": llm_query,
+        "suggest_answer": suggest_answer,
+        "key_terms": preprocessed["key_terms"],
+        "query_date": query_date,
+        "query_duration": query_duration,
+        "date_range": date_range,
+        "bin_ranges": build_bin_ranges(date_range, query_date),
+        "skipped_stages": preprocessed["skipped_stages"],
+        "degraded": preprocessed.get("degraded", False),
+    }
 
-        llm_token_count = len(llm_query.split())  # Approximate token count
-        logging.info(f"LLM Query Token Count: {llm_token_count}")
 
-        # Start embedding generation
-        embed_start = time.time()
-        query_vector = emb_text(model, llm_query)#; logging.info(query_vector)
-        embed_time = time.time() - embed_start
+def rerank_text(plan):
+    """CrossEncoder query: the rewrite followed by the suggested answer, when there is one."""
+    if not plan["suggest_answer"]:
+        return plan["llm_query"]
+    return plan["llm_query"] + "\n" + plan["suggest_answer"]
 
-        logging.info(f"Embedding generation time: {embed_time:.4f} seconds")
 
-        total_search_time = 0.0
-        top_results_to_return = []
+def bin_label(start_date, end_date):
+    return f"{start_date.strftime('%B %Y')} to {end_date.strftime('%B %Y')}"
 
-        used_buckets = []
-        used_indices = []
 
-        for start_date, end_date in date_range:
-            chunk_label = f"{start_date.strftime('%B %Y')} to {end_date.strftime('%B %Y')}"
-            logging.info(f"Processing range: {chunk_label}")
-            months_before = (months_since(start_date.strftime("%B %Y"), query_date))
-            months_after = (months_since(query_date, end_date.strftime("%B %Y")))
-            milvus_date_filter = build_range_around_date(
-                query_date, months_before, months_after
-            )["filter"]
-            #logging.info(str(milvus_date_filter))
-
-            # Search in Milvus
-            search_start = time.time()
-            search_res = get_search_results(
-                milvus_client, CPI_V6_COLLECTION_NAME, query_vector, ["content", "source", "id", "page", "reference", "date"],
-                milvus_date_filter, bin_size
-            )
-            search_time = time.time() - search_start
-            total_search_time += search_time
-            logging.info(f"Milvus search execution time: {search_time:.4f} seconds")
-            logging.info(f"Document search date filter: {milvus_date_filter}")
-
-            if not search_res or not search_res[0]:
-                logging.warning(f"No results found for {chunk_label}")
-                continue
-                #raise HTTPException(status_code=404, detail="No results found")
-
-            # Retrieve the top results
-            top_results = [
-                {
-                    "id": result["id"],
-                    "content": result["entity"]["content"],
-                    "distance": result["distance"],
-                    "source": result["entity"]["source"],
-                    "page": result["entity"]["page"],
-                    "reference": result["entity"]["reference"],
-                    "date": result["entity"]["date"]
-                }
-                for result in search_res[0]
-            ]
-            n_results = len(top_results)
-
-            # Log Top 15
-            logging.info(f"Top {n_results} sources before reranking:")
-            for i, item in enumerate(top_results, start=1):
-                logging.info(
-            #        f"Result - Content: {item['content']}, Page: {item['page']}, "
-                    f"Source: {item['source']}, Reference: {item['reference']}, Date: {item['date']}, Distance: {item['distance']:.4f}"
-                )
+def hits_to_results(chunk_label, milvus_date_filter, search_res, search_time):
+    """Flattens one bin's Milvus hits into result dictionaries, or [] if the bin is empty."""
+    logging.info(f"Processing range: {chunk_label}")
+    logging.info(f"Milvus search execution time: {search_time:.4f} seconds")
+    logging.info(f"Document search date filter: {milvus_date_filter}")
 
-            #  Rerank with CrossEncoder
-            #pairs = [(llm_query, str(item["content"]) + "\n\nResult from " + str(item["reference"]) + ", " + str(item['date'])) for item in top_results]
-            pairs = [(llm_query + "\n" + suggest_answer, str(item["content"]) + "\n\nResult from " + str(item["reference"]) + ", " + str(item['date'])) for item in top_results]
-            scores = cross_encoder.predict(pairs)
-            counts = []
-            for item in top_results:
-                count = sum(term in str(item['content']) for term in key_terms)
-                counts.append(count)
-            counts = np.array(counts).astype(float)
-            counts -= 0.25*len(key_terms)
-            scores += counts
-            penalty = np.array([10*(item['content'].count("\n")+item['content'].count("|"))/len(item['content']) for item in top_results])
-            scores -= penalty
-            scores = np.round(1 / (1 + np.exp(-scores)),decimals=3)
-            logging.info("Scores: " + str(scores))
-            logging.info("Lexical boosts: " + str(counts))
-            logging.info("Noise penalty : " + str(penalty))
-            try:
-                logging.info("Attempting chunk addition")
+    if not search_res or not search_res[0]:
+        logging.warning(f"No results found for {chunk_label}")
+        return []
+        #raise HTTPException(status_code=404, detail="No results found")
+
+    # Retrieve the top results
+    top_results = [
+        {
+            "id": result["id"],
+            "content": result["entity"]["content"],
+            "distance": result["distance"],
+            "source": result["entity"]["source"],
+            "page": result["entity"]["page"],
+            "reference": result["entity"]["reference"],
+            "date": result["entity"]["date"]
+        }
+        for result in search_res[0]
+    ]
+    n_results = len(top_results)
+
+    # Log Top 15
+    logging.info(f"Top {n_results} sources before reranking:")
+    for i, item in enumerate(top_results, start=1):
+        logging.info(
+    #        f"Result - Content: {item['content']}, Page: {item['page']}, "
+            f"Source: {item['source']}, Reference: {item['reference']}, Date: {item['date']}, Distance: {item['distance']:.4f}"
+        )
+    return top_results
 
-                # 1. Find items in top_results with score >= 0.5 after normalization
-                candidates = [
-                    (item, score)
-                    for item, score in zip(top_results, scores)
-                    if score >= 0.5
-                ]
 
-                if candidates:
+class BinSelector:
+    """
+    Per-request state for picking results bin by bin from CrossEncoder scores.
+    Bins must be fed in date_range order: neighbour expansion and de-duplication
+    depend on what earlier bins already used.
+    """
 
-                    # 2. Generate [reference, page]—also including one page before and after
+    def __init__(self, query_date, query_duration, key_terms, top_k=6):
+        self.query_date = query_date
+        self.query_duration = query_duration
+        self.key_terms = key_terms
+        self.top_k = top_k
+        self.used_buckets = []
+        self.used_indices = []
+        self.selected = []
+
+    async def select(self, chunk_label, top_results, raw_scores):
+        """Selects this bin's results, records them in self.selected and returns them."""
+        key_terms = self.key_terms
+        query_date = self.query_date
+        query_duration = self.query_duration
+        top_k = self.top_k
+        used_buckets = self.used_buckets
+        used_indices = self.used_indices
+
+        scores = np.array(raw_scores)
+        counts = []
+        for item in top_results:
+            count = sum(term in str(item['content']) for term in key_terms)
+            counts.append(count)
+        counts = np.array(counts).astype(float)
+        counts -= 0.25*len(key_terms)
+        scores += counts
+        penalty = np.array([10*(item['content'].count("\n")+item['content'].count("|"))/len(item['content']) for item in top_results])
+        scores -= penalty
+        scores = np.round(1 / (1 + np.exp(-scores)),decimals=3)
+        logging.info("Scores: " + str(scores))
+        logging.info("Lexical boosts: " + str(counts))
+        logging.info("Noise penalty : " + str(penalty))
+        try:
+            logging.info("Attempting chunk addition")
+
+            # 1. Find items in top_results with score >= 0.5 after normalization
+            candidates = [
+                (item, score)
+                for item, score in zip(top_results, scores)
+                if score >= 0.5
+            ]
 
-                    for item, _, in candidates:
-                        reference  = item["reference"]
-                        page       = int(item["page"])
-                        current_id = int(item["id"])
-                        #logging.info("Found current id " + str(current_id))
-                        # Assuming 'page' is an integer
-                        group_content = ""
-                        new_search = []
-                        for p in [page - 1, page, page + 1]:
-                            new_search.append([reference, str(p)])
-
-                        # 3. Retrieve all matching chunks
-                        add_result = get_chunks_by_reference_page_pairs(
-                            milvus_client,
-                            CPI_V6_COLLECTION_NAME,
-                            new_search
-                        )
-                        
-                        id_list    = [int(item["id"]) for item in add_result]
-                        #logging.info("Found id list " + str(id_list))
-                        secn_start = [1 if "[SECTION]" in item['content'] else 0 for item in add_result]
-                        #logging.info("Sections start at " + str(secn_start))
-                        pos        = id_list.index(current_id)
-                        #logging.info("Found current section at " + str(pos))
-                        
-                        before = None
-                        for i in range(pos, -1, -1):
-                            if secn_start[i] == 1:
-                                before = i
-                                break
-                        if before is None:
-                            before = max(0,pos - 1)
-                            
-                        after = None
-                        for i in range(pos+1, len(secn_start)):
-                            if secn_start[i] == 1:
-                                after = i
-                                break
-                        if after is None:
-                            after = len(secn_start)
-
-                        if [before, after] not in used_buckets:
-                            used_buckets.append([before, after])
-                            #logging.info("Collating between " + str([before, after]))
-                            group_content = ""
-                            for i in range(before, after):
-                                if (len(group_content) < 10000) or (i <= pos):
-                                    group_content += add_result[i]['content']
-                            
-                            item['content'] = group_content
+            if candidates:
+
+                # 2. Generate [reference, page]—also including one page before and after
+
+                for item, _, in candidates:
+                    reference  = item["reference"]
+                    page       = int(item["page"])
+                    current_id = int(item["id"])
+                    #logging.info("Found current id " + str(current_id))
+                    # Assuming 'page' is an integer
+                    group_content = ""
+                    new_search = []
+                    for p in [page - 1, page, page + 1]:
+                        new_search.append([reference, str(p)])
+
+                    # 3. Retrieve all matching chunks
+                    add_result = await run_milvus(
+                        get_chunks_by_reference_page_pairs,
+                        CPI_V6_COLLECTION_NAME,
+                        new_search
+                    )
+                    
+                    id_list    = [int(item["id"]) for item in add_result]
+                    #logging.info("Found id list " + str(id_list))
+                    secn_start = [1 if "[SECTION]" in item['content'] else 0 for item in add_result]
+                    #logging.info("Sections start at " + str(secn_start))
+                    pos        = id_list.index(current_id)
+                    #logging.info("Found current section at " + str(pos))
                     
-                    """
-                    for item, _, in candidates:
-                        reference = item["reference"]
-                        page = int(item["page"])
-                        # Assuming 'page' is an integer
+                    before = None
+                    for i in range(pos, -1, -1):
+                        if secn_start[i] == 1:
+                            before = i
+                            break
+                    if before is None:
+                        before = max(0,pos - 1)
+                        
+                    after = None
+                    for i in range(pos+1, len(secn_start)):
+                        if secn_start[i] == 1:
+                            after = i
+                            break
+                    if after is None:
+                        after = len(secn_start)
+
+                    if [before, after] not in used_buckets:
+                        used_buckets.append([before, after])
+                        #logging.info("Collating between " + str([before, after]))
                         group_content = ""
-                        for p in [page - 1, page, page + 1]:
-                            new_search = []
-                            new_search.append([reference, str(p)])
-
-                            # 3. Retrieve all matching chunks
-                            add_result = get_chunks_by_reference_page_pairs(
-                                milvus_client,
-                                CPI_V6_COLLECTION_NAME,
-                                new_search
-                            )
-                            if not (not add_result or not add_result[0]):
-                                if p == page - 1:
-                                    group_content += add_result[-1]['content']
-                                if p == page + 1:
-                                    group_content += add_result[0]['content']
-                                if p == page:
-                                    for item_inner in add_result:
-                                        group_content += item_inner['content'] + "\n"
-                        item['content'] = group_content[:10000]
-                        """
-                    n_results = len(top_results)
+                        for i in range(before, after):
+                            if (len(group_content) < 10000) or (i <= pos):
+                                group_content += add_result[i]['content']
+                        
+                        item['content'] = group_content
 
-                else:
-                    logging.info("No qualifying chunks")
+            else:
+                logging.info("No qualifying chunks")
 
-            except Exception as e:
-                logging.info("Failed with exception: " + str(e))
+        except Exception as e:
+            logging.info("Failed with exception: " + str(e))
 
-            # Let's assume each item in top_15 has a "date" field
-            deltas   = [(months_since(item["date"],query_date)) for item in top_results] # Signed deltas, positive = older and negative = newer than query date
-            if min(deltas) > 0:
-                # Date is too recent, we do not have matching documents
-                maxdelta = min(deltas)
+        # Let's assume each item in top_15 has a "date" field
+        deltas   = [(months_since(item["date"],query_date)) for item in top_results] # Signed deltas, positive = older and negative = newer than query date
+        if min(deltas) > 0:
+            # Date is too recent, we do not have matching documents
+            maxdelta = min(deltas)
+        else:
+            # We have at least one document matching the query date
+            if max(deltas) < 0:
+                # Date is too old, we do not have documents that old
+                maxdelta = max(deltas)
             else:
-                # We have at least one document matching the query date
-                if max(deltas) < 0:
-                    # Date is too old, we do not have documents that old
-                    maxdelta = max(deltas)
-                else:
-                    maxdelta = 0
-            maxdelta += 0.5*query_duration
-            mindelta = maxdelta - query_duration
-            lookup_delta = [[-2,max(2,query_duration)], [mindelta,maxdelta], [mindelta+6,maxdelta+6]]
-            chunks_found = False
-            chunk_attempt = 0
-            top_internal = []
-            top_index   = []
-            chunk_index = [xx for xx in range(len(deltas))]
-            while ((not chunks_found) and (chunk_attempt < 3) and (len(top_internal) < 3)):
-                if chunk_attempt < len(lookup_delta):
-                    curtuple = lookup_delta[chunk_attempt]
-                else:
-                    curtuple = lookup_delta[-1]
-                mindelta = curtuple[0]
-                maxdelta = curtuple[1]
-
-                chunk_attempt += 1
-                logging.info("Deltas being used: " + str([mindelta,maxdelta]))
-                #logging.info("Computed deltas")
-                #logging.info(deltas)
-                date_boosts = [0 if maxdelta >= deltas[xx] >= mindelta else 25 for xx in range(len(deltas))]
-
-                # Add boosted scores to the cross_encoder scores
-                #logging.info("Original scores: " + str(scores))
-                final_scores = [s - boost for s, boost in zip(scores, date_boosts)]
-                #logging.info("Modified scores: " + str(final_scores))
-
-                # Now rerank based on the final boosted score
-                reranked = sorted(
-                zip(top_results, final_scores, chunk_index),
-                key=lambda x: x[1],
-                reverse=True
-                )
+                maxdelta = 0
+        maxdelta += 0.5*query_duration
+        mindelta = maxdelta - query_duration
+        lookup_delta = [[-2,max(2,query_duration)], [mindelta,maxdelta], [mindelta+6,maxdelta+6]]
+        chunks_found = False
+        chunk_attempt = 0
+        top_internal = []
+        top_index   = []
+        chunk_index = [xx for xx in range(len(deltas))]
+        while ((not chunks_found) and (chunk_attempt < 3) and (len(top_internal) < 3)):
+            if chunk_attempt < len(lookup_delta):
+                curtuple = lookup_delta[chunk_attempt]
+            else:
+                curtuple = lookup_delta[-1]
+            mindelta = curtuple[0]
+            maxdelta = curtuple[1]
+
+            chunk_attempt += 1
+            logging.info("Deltas being used: " + str([mindelta,maxdelta]))
+            #logging.info("Computed deltas")
+            #logging.info(deltas)
+            date_boosts = [0 if maxdelta >= deltas[xx] >= mindelta else 25 for xx in range(len(deltas))]
+
+            # Add boosted scores to the cross_encoder scores
+            #logging.info("Original scores: " + str(scores))
+            final_scores = [s - boost for s, boost in zip(scores, date_boosts)]
+            #logging.info("Modified scores: " + str(final_scores))
+
+            # Now rerank based on the final boosted score
+            reranked = sorted(
+            zip(top_results, final_scores, chunk_index),
+            key=lambda x: x[1],
+            reverse=True
+            )
 
-                # Top 5 with cross_score filtering
-                content_concat = []
-                cross_thresh = 0.5 - 0.1*chunk_attempt
-                for item, score, cur_index in reranked[:top_k]:
-                    item["cross_score"] = np.round(float(score),decimals=3)
-                    if (item["cross_score"] > cross_thresh) and (cur_index not in top_index) and (item["id"] not in used_indices):  # Only include results where cross_score > threshold
-                        # Attach the reference URL
-                        item["url"] = get_reference_url(item["reference"], item["source"])
-                        top_internal.append(item)
-                        top_results_to_return.append(item)
-                        top_index.append(cur_index)
-                        used_indices.append(item["id"])
-                        content_concat += item["content"]
-                        #best_relevance = max(best_relevance,item["cross_score"])
-
-                if len(top_internal) < 3:
-                    logging.warning("Not enough valid results found in current attempt: (" + str(len(top_internal)) + "/"+str(top_k)+"). Relaxing cross score and deltas ..")
-                    #mindelta += 6
-                    #maxdelta += 6
-                else:
-                    chunks_found = True
-            if len(top_internal) > 0:
-                n_this_time = len(top_internal)
-                logging.info(f"Appending {n_this_time} snippets for {chunk_label}")
+            # Top 5 with cross_score filtering
+            content_concat = []
+            cross_thresh = 0.5 - 0.1*chunk_attempt
+            for item, score, cur_index in reranked[:top_k]:
+                item["cross_score"] = np.round(float(score),decimals=3)
+                if (item["cross_score"] > cross_thresh) and (cur_index not in top_index) and (item["id"] not in used_indices):  # Only include results where cross_score > threshold
+                    # Attach the reference URL
+                    item["url"] = get_reference_url(item["reference"], item["source"])
+                    top_internal.append(item)
+                    self.selected.append(item)
+                    top_index.append(cur_index)
+                    used_indices.append(item["id"])
+                    content_concat += item["content"]
+                    #best_relevance = max(best_relevance,item["cross_score"])
+
+            if len(top_internal) < 3:
+                logging.warning("Not enough valid results found in current attempt: (" + str(len(top_internal)) + "/"+str(top_k)+"). Relaxing cross score and deltas ..")
+                #mindelta += 6
+                #maxdelta += 6
             else:
-                n_this_time = 0
+                chunks_found = True
+        if len(top_internal) > 0:
+            n_this_time = len(top_internal)
+            logging.info(f"Appending {n_this_time} snippets for {chunk_label}")
+        return top_internal
+
+
+def build_response(question_text, plan, top_results_to_return, start_time):
+    """Globally sorted, char-budgeted response body for the selected results."""
+    # Check if no valid results with cross_score > 0 were found
+
+    if not top_results_to_return:
+        logging.warning("No valid results with cross_score > 0")
+        total_time = time.time() - start_time
+        logging.info(f"Total processing time: {total_time:.4f} seconds")
+        return {
+            "question": question_text,
+            "llm_query": plan["llm_query"],
+            "query_date": plan["query_date"],
+            "retrieved_results": [{
+                "content": "<insufficient_data>", #"We could not find any relevant content related to your query.",
+                "distance": "N/A",
+                "source": "N/A",
+                "page": "N/A",
+                "reference": "N/A",
+                "date": "N/A",
+                "url": "N/A"
+            }],
+            "skipped_stages": plan["skipped_stages"],
+            "degraded": plan["degraded"],
+            "time": total_time,
+        }
+    else:
+        # Log Top 5
+        top_results_to_return.sort(key=lambda item: item["cross_score"], reverse=True)
+        final_return = []
+        char_count   = 0
+        for item in top_results_to_return:
+            if char_count < 40000:
+                final_return.append(item.copy())
+                char_count += len(item["content"])
+        n_final = len(final_return)
+        logging.info(f"Top {n_final} results after reranking:")
+        for i, res in enumerate(final_return, start=1):
+            logging.info(
+                f"{i}. Content: {res['content'][:200]}..., Page: {res['page']}, "
+                f"Source: {res['source']}, Reference: {res['reference']}, Date: {item['date']}, Distance: {res['distance']:.4f}, Cross Score: {res['cross_score']:.4f}"
+            )
+        total_time = time.time() - start_time
+        logging.info(f"Total processing time: {total_time:.4f} seconds")
+        return {
+            "question": question_text,
+            "llm_query": plan["llm_query"],
+            "query_date": plan["query_date"],
+            "retrieved_results": final_return,
+            "skipped_stages": plan["skipped_stages"],
+            "degraded": plan["degraded"],
+            "time": total_time,
+        }
 
-        # Check if no valid results with cross_score > 0 were found
 
-        if not top_results_to_return:
-            logging.warning("No valid results with cross_score > 0")
-            total_time = time.time() - start_time
-            logging.info(f"Total processing time: {total_time:.4f} seconds")
-            return {
-                "question": question.question,
-                "llm_query": llm_query,
-                "query_date": query_date,
-                "retrieved_results": [{
-                    "content": "<insufficient_data>", #"We could not find any relevant content related to your query.",
-                    "distance": "N/A",
-                    "source": "N/A",
-                    "page": "N/A",
-                    "reference": "N/A",
-                    "date": "N/A",
-                    "url": "N/A"
-                }],
-                "time": total_time,
-            }
+async def embed_query(question_text, llm_query):
+    # Track token count
+    token_count = len(question_text.split())  # Approximate token count
+    logging.info(f"Question Token Count: {token_count}")
+
+    llm_token_count = len(llm_query.split())  # Approximate token count
+    logging.info(f"LLM Query Token Count: {llm_token_count}")
+
+    # Start embedding generation
+    embed_start = time.time()
+    query_vector = await embed_text(llm_query)#; logging.info(query_vector)
+    embed_time = time.time() - embed_start
+
+    logging.info(f"Embedding generation time: {embed_time:.4f} seconds")
+    return query_vector
+
+
+# Search API Endpoint
+@app.post("/search-topN", dependencies=[Depends(verify_api_key)])
+async def search_topN_milvus(request: Request, response: Response, question: Question):
+    start_time = time.time()
+    request_time = datetime.utcnow().isoformat()
+
+    client_ip = request.client.host  # Get client IP address
+    logging.info(f"Received request from {client_ip} at {request_time}")
+
+    cache_version = response_cache.version
+    if RESPONSE_CACHE_ENABLED:
+        if "no-cache" in request.headers.get("cache-control", "").lower():
+            response_cache.record_bypass()
+            response.headers["X-Cache"] = "BYPASS"
         else:
-            # Log Top 5
-            top_results_to_return.sort(key=lambda item: item["cross_score"], reverse=True)
-            final_return = []
-            char_count   = 0
-            for item in top_results_to_return:
-                if char_count < 40000:
-                    final_return.append(item.copy())
-                    char_count += len(item["content"])
-            n_final = len(final_return)
-            logging.info(f"Top {n_final} results after reranking:")
-            for i, res in enumerate(final_return, start=1):
-                logging.info(
-                    f"{i}. Content: {res['content'][:200]}..., Page: {res['page']}, "
-                    f"Source: {res['source']}, Reference: {res['reference']}, Date: {item['date']}, Distance: {res['distance']:.4f}, Cross Score: {res['cross_score']:.4f}"
-                )
-            total_time = time.time() - start_time
-            logging.info(f"Total processing time: {total_time:.4f} seconds")
-            return {
-                "question": question.question,
-                "llm_query": llm_query,
-                "query_date": query_date,
-                "retrieved_results": final_return,
-                "time": total_time,
-            }
+            cached = response_cache.get(question.question)
+            if cached is not None:
+                # Keys are normalized, so echo this request's wording, not the cached one
+                cached["question"] = question.question
+                cached["time"] = time.time() - start_time
+                logging.info(f"Response cache hit for: {question.question}")
+                response.headers["X-Cache"] = "HIT"
+                return cached
+            response.headers["X-Cache"] = "MISS"
+
+    try:
+        async with admission.admit():
+            return await run_search(request, question, start_time, cache_version)
+    except AdmissionRejected as e:
+        raise reject(e)
 
 
+async def run_search(request: Request, question: Question, start_time, cache_version):
+    # Overlaps retrieval for the raw question with the LLM preprocessing below
+    speculation = asyncio.ensure_future(speculate(question.question)) if SPECULATIVE_RETRIEVAL else None
+    try:
+        plan = await plan_retrieval(question.question, deadline=request_deadline(request.headers))
+    except BaseException:
+        if speculation is not None:
+            speculation.cancel()
+        raise
+    date_range = plan["date_range"]
+    bin_size = len(date_range)
+
+    try:
+        seeded = await use_speculation(speculation, plan["bin_ranges"], bin_size)
+        remaining = [index for index in range(bin_size) if index not in seeded]
+
+        # Search in Milvus, all bins at once
+        bin_searches = dict(seeded)
+        if remaining:
+            query_vector = await embed_query(question.question, plan["llm_query"])
+            if seeded:
+                searched = await search_bins(query_vector, [plan["bin_ranges"][index]["filter"] for index in remaining], bin_size)
+            else:
+                searched = await retrieve_bins(query_vector, plan["bin_ranges"], bin_size)
+            bin_searches.update(zip(remaining, searched))
+
+        # Collect every bin's candidates first so they can be reranked in one batch
+        bin_candidates = []
+        for index, ((start_date, end_date), bin_range) in enumerate(zip(date_range, plan["bin_ranges"])):
+            search_res, search_time = bin_searches[index]
+            chunk_label = bin_label(start_date, end_date)
+            top_results = hits_to_results(chunk_label, bin_range["filter"], search_res, search_time)
+            if top_results:
+                bin_candidates.append((chunk_label, top_results))
+
+        #  Rerank with CrossEncoder, seeded bins included, so all scores share one query
+        #pairs = [(llm_query, str(item["content"]) + "\n\nResult from " + str(item["reference"]) + ", " + str(item['date'])) for item in top_results]
+        rerank_start = time.time()
+        cross_scores = await cross_encode(rerank_text(plan), [item for _, top_results in bin_candidates for item in top_results])
+        logging.info(f"CrossEncoder scored {len(cross_scores)} unique candidates in {time.time() - rerank_start:.4f} seconds")
+
+        selector = BinSelector(plan["query_date"], plan["query_duration"], plan["key_terms"])
+        for chunk_label, top_results in bin_candidates:
+            await selector.select(chunk_label, top_results, [cross_scores[item["id"]] for item in top_results])
+
+        result = build_response(question.question, plan, selector.selected, start_time)
+        if RESPONSE_CACHE_ENABLED and not plan["skipped_stages"]:
+            response_cache.put(question.question, result, cache_version)
+        return result
+
     except Exception as e:
         error_message = f"Error processing request: {str(e)}"
         logging.error(error_message, exc_info=True)
-        raise HTTPException(status_code=500, detail=error_message)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_message)
+
+
+def ndjson_event(event, **fields):
+    return json.dumps({"event": event, **fields}, default=str) + "\n"
+
+
+@app.post("/search-topN/stream", dependencies=[Depends(verify_api_key)])
+async def search_topN_stream(request: Request, question: Question):
+    """
+    Streaming variant of /search-topN. Emits newline-delimited JSON events: one
+    "query" event once preprocessing is done, one "bin" event per date bin with
+    that bin's selected results as soon as it is scored, and a "final" event
+    carrying the same body /search-topN returns. Bins are emitted in date_range
+    order because de-duplication depends on earlier bins.
+    """
+    start_time = time.time()
+    request_time = datetime.utcnow().isoformat()
+
+    client_ip = request.client.host  # Get client IP address
+    logging.info(f"Received streaming request from {client_ip} at {request_time}")
+
+    try:
+        slot = await admission.slot()
+    except AdmissionRejected as e:
+        raise reject(e)
+    try:
+        plan = await plan_retrieval(question.question, deadline=request_deadline(request.headers))
+    except BaseException:
+        slot.release()
+        raise
+    date_range = plan["date_range"]
+    bin_size = len(date_range)
+    rerank_query = rerank_text(plan)
+
+    async def events():
+        try:
+            yield ndjson_event(
+                "query",
+                question=question.question,
+                llm_query=plan["llm_query"],
+                query_date=plan["query_date"],
+                skipped_stages=plan["skipped_stages"],
+                degraded=plan["degraded"],
+                bins=[bin_label(start_date, end_date) for start_date, end_date in date_range],
+            )
+            try:
+                query_vector = await embed_query(question.question, plan["llm_query"])
+                selector = BinSelector(plan["query_date"], plan["query_duration"], plan["key_terms"])
+                bin_searches = iter_bin_searches(query_vector, plan["bin_ranges"], bin_size)
+                for (start_date, end_date), bin_range in zip(date_range, plan["bin_ranges"]):
+                    search_res, search_time = await bin_searches.__anext__()
+                    chunk_label = bin_label(start_date, end_date)
+                    top_results = hits_to_results(chunk_label, bin_range["filter"], search_res, search_time)
+                    top_internal = []
+                    if top_results:
+                        cross_scores = await cross_encode(rerank_query, top_results)
+                        top_internal = await selector.select(chunk_label, top_results, [cross_scores[item["id"]] for item in top_results])
+                    yield ndjson_event("bin", range=chunk_label, results=[item.copy() for item in top_internal])
+                await bin_searches.aclose()
+                yield ndjson_event("final", **build_response(question.question, plan, selector.selected, start_time))
+            except Exception as e:
+                error_message = f"Error processing request: {str(e)}"
+                logging.error(error_message, exc_info=True)
+                yield ndjson_event("error", detail=error_message)
+        finally:
+            # The slot is held until the last event has been produced or the client went away
+            slot.release()
+
+    stream = events()
+    # A generator that is never iterated (client gone before streaming starts)
+    # never reaches its finally; the background task and the finalizer cover that.
+    weakref.finalize(stream, slot.release)
+    return StreamingResponse(stream, media_type="application/x-ndjson", background=BackgroundTask(slot.release))
+
+
+@app.post("/search-topN/batch", dependencies=[Depends(verify_api_key)])
+async def search_topN_batch(request: Request, batch: QuestionBatch):
+    """
+    /search-topN for a list of questions. Embeddings and CrossEncoder scores are
+    computed in batches of the shared batchers' max size, and bins sharing a
+    date filter are searched together. Preprocessing runs for at most
+    SEARCH_BATCH_PLAN_CONCURRENCY questions at a time, each within the usual
+    per-request deadline, and the whole batch within SEARCH_BATCH_DEADLINE.
+    A failing question yields an entry with an "error" field instead of failing
+    the whole batch.
+    """
+    start_time = time.time()
+    request_time = datetime.utcnow().isoformat()
+    questions = batch.questions
+    if len(questions) > SEARCH_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX_QUESTIONS} questions per batch")
+
+    client_ip = request.client.host  # Get client IP address
+    logging.info(f"Received batch of {len(questions)} questions from {client_ip} at {request_time}")
+
+    deadline = request_deadline(request.headers, SEARCH_BATCH_DEADLINE)
+    try:
+        async with batch_admission.admit():
+            return await run_search_batch(questions, start_time, deadline)
+    except AdmissionRejected as e:
+        raise reject(e)
+
+
+async def run_search_batch(questions, start_time, deadline):
+    results = [None] * len(questions)
+
+    def fail(index, stage, e):
+        logging.error(f"Batch question {index} failed during {stage}: {e}", exc_info=e)
+        results[index] = {"question": questions[index], "error": f"Error processing request: {str(e)}"}
+
+    plan_slots = asyncio.Semaphore(SEARCH_BATCH_PLAN_CONCURRENCY)
+
+    async def plan_one(question_text):
+        async with plan_slots:
+            if deadline.remaining() <= 0:
+                raise TimeoutError("Batch deadline exceeded before preprocessing")
+            return await plan_retrieval(question_text, deadline=Deadline(min(REQUEST_DEADLINE, deadline.remaining())))
+
+    plans = await asyncio.gather(*(plan_one(q) for q in questions), return_exceptions=True)
+    active = []
+    for index, plan in enumerate(plans):
+        if isinstance(plan, Exception):
+            fail(index, "preprocessing", plan)
+        else:
+            active.append(index)
+
+    try:
+        query_vectors = await asyncio.wait_for(embed_texts([plans[index]["llm_query"] for index in active]), deadline.remaining())
+        bin_searches = await asyncio.wait_for(search_bins_batch(query_vectors, [plans[index]["bin_ranges"] for index in active]), deadline.remaining())
+    except Exception as e:
+        for index in active:
+            fail(index, "retrieval", e)
+        active = []
+        bin_searches = []
+
+    bin_candidates = {}
+    for index, searches in zip(active, bin_searches):
+        plan = plans[index]
+        candidates = []
+        for (start_date, end_date), bin_range, (search_res, search_time) in zip(plan["date_range"], plan["bin_ranges"], searches):
+            chunk_label = bin_label(start_date, end_date)
+            top_results = hits_to_results(chunk_label, bin_range["filter"], search_res, search_time)
+            if top_results:
+                candidates.append((chunk_label, top_results))
+        bin_candidates[index] = candidates
+
+    rerank_start = time.time()
+    try:
+        cross_scores = await asyncio.wait_for(cross_encode_many([
+            (rerank_text(plans[index]), [item for _, top_results in bin_candidates[index] for item in top_results])
+            for index in active
+        ]), deadline.remaining())
+        logging.info(f"CrossEncoder scored {sum(len(s) for s in cross_scores)} candidates for {len(active)} questions in {time.time() - rerank_start:.4f} seconds")
+    except Exception as e:
+        for index in active:
+            fail(index, "reranking", e)
+        active = []
+        cross_scores = []
+
+    for index, scores in zip(active, cross_scores):
+        plan = plans[index]
+        try:
+            if deadline.remaining() <= 0:
+                raise TimeoutError("Batch deadline exceeded before selection")
+            selector = BinSelector(plan["query_date"], plan["query_duration"], plan["key_terms"])
+            for chunk_label, top_results in bin_candidates[index]:
+                await selector.select(chunk_label, top_results, [scores[item["id"]] for item in top_results])
+            results[index] = build_response(questions[index], plan, selector.selected, start_time)
+        except Exception as e:
+            fail(index, "selection", e)
+
+    total_time = time.time() - start_time
+    logging.info(f"Batch of {len(questions)} questions processed in {total_time:.4f} seconds")
+    return {"results": results, "time": total_time}
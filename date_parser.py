@@ -0,0 +1,182 @@
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+
+# Rule-based replacement for the fetch_date / fetch_min_date Gemini calls. It
+# follows the Indian fiscal-year conventions spelled out in the clarify_query
+# prompt (FY25 -> April 2024 to March 2025) and returns None when the query has
+# no expression it understands, so callers can fall back to the LLM.
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10,
+    "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+_FY = r"(?:fy|f\.y\.|financial\s+year|fiscal\s+year)\s*'?"
+_YEAR_SPAN = r"(\d{4}|\d{2})(?:\s*[-–/]\s*(\d{4}|\d{2}))?"
+_RANGE_SEP = r"\s*(?:-|–|to|through|till|until|and)\s*"
+
+H_FY_RE = re.compile(rf"\bh([12])\s*(?:of\s+)?{_FY}{_YEAR_SPAN}\b", re.IGNORECASE)
+Q_FY_RE = re.compile(rf"\bq([1-4])\s*(?:of\s+)?{_FY}{_YEAR_SPAN}\b", re.IGNORECASE)
+FY_RE = re.compile(rf"\b{_FY}{_YEAR_SPAN}\b", re.IGNORECASE)
+Q_YEAR_RE = re.compile(r"\bq([1-4])\s*(?:of\s+)?(\d{4})\b", re.IGNORECASE)
+MONTH_PAIR_RE = re.compile(rf"\b{_MONTH}{_RANGE_SEP}{_MONTH},?\s+(\d{{4}})\b", re.IGNORECASE)
+SINCE_MONTH_RE = re.compile(rf"\b(?:since|from)\s+{_MONTH},?\s+(\d{{4}})\b(?!{_RANGE_SEP}(?:{_MONTH}|\d{{4}}))", re.IGNORECASE)
+MONTH_YEAR_RE = re.compile(rf"\b{_MONTH},?\s+(\d{{4}})\b", re.IGNORECASE)
+YEAR_SPAN_RE = re.compile(r"\b(20\d{2})\s*[-–]\s*(20\d{2}|\d{2})\b")
+RELATIVE_RE = re.compile(
+    r"\b(?:last|past|previous|preceding)\s+(\d{1,2}|a|an|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)?\s*(month|quarter|year)s?\b",
+    re.IGNORECASE,
+)
+SINCE_YEAR_RE = re.compile(r"\bsince\s+(\d{4})\b", re.IGNORECASE)
+# A bare number like "top 2000 companies" is only a year after a date word or at
+# the end of a sentence ("CPI inflation 2023?")
+YEAR_RE = re.compile(
+    r"\b(?:in|during|for|of|year|calendar\s+year|cy|from|by|to|until|till|through|before|after|between|and|vs\.?|versus)\s+(19[5-9]\d|20\d{2})\b",
+    re.IGNORECASE,
+)
+TRAILING_YEAR_RE = re.compile(r"\b(19[5-9]\d|20\d{2})(?=\s*(?:[?.!,;)]|$))")
+NOW_RE = re.compile(r"\b(?:latest|current|currently|recent|recently|today|this\s+month|now)\b", re.IGNORECASE)
+
+
+def _full_year(value: str) -> int:
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _month(value: str) -> int:
+    key = value.lower().rstrip(".")
+    return MONTHS[key] if key in MONTHS else MONTHS[key[:3]]
+
+
+def _fy_start_year(first: str, second: Optional[str]) -> Optional[int]:
+    """
+    FY25 and FY2025 end in March 2025; FY23-24 and FY 2025-26 name both years.
+    """
+    if second is None:
+        return _full_year(first) - 1
+    start, end = _full_year(first), _full_year(second)
+    if end % 100 != (start + 1) % 100:
+        return None
+    return start
+
+
+def _span(start: datetime, months: int) -> Tuple[datetime, datetime]:
+    return start, start + relativedelta(months=months - 1)
+
+
+def _consume(text: str, match: re.Match) -> str:
+    # Blank out matched text so less specific rules don't parse it a second time
+    return text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+
+
+def _extract(text: str, today: datetime) -> List[Tuple[datetime, datetime]]:
+    ranges = []
+
+    for match in list(H_FY_RE.finditer(text)):
+        start_year = _fy_start_year(match.group(2), match.group(3))
+        if start_year is not None:
+            half = int(match.group(1))
+            ranges.append(_span(datetime(start_year, 4, 1) + relativedelta(months=6 * (half - 1)), 6))
+        text = _consume(text, match)
+
+    for match in list(Q_FY_RE.finditer(text)):
+        start_year = _fy_start_year(match.group(2), match.group(3))
+        if start_year is not None:
+            quarter = int(match.group(1))
+            ranges.append(_span(datetime(start_year, 4, 1) + relativedelta(months=3 * (quarter - 1)), 3))
+        text = _consume(text, match)
+
+    for match in list(FY_RE.finditer(text)):
+        start_year = _fy_start_year(match.group(1), match.group(2))
+        if start_year is not None:
+            ranges.append(_span(datetime(start_year, 4, 1), 12))
+        text = _consume(text, match)
+
+    # "Q3 2022" -> October to December 2022, as in the fetch_date prompt: quarters
+    # count from April of the named year, so Q4 2022 is January to March 2023.
+    for match in list(Q_YEAR_RE.finditer(text)):
+        quarter = int(match.group(1))
+        ranges.append(_span(datetime(int(match.group(2)), 4, 1) + relativedelta(months=3 * (quarter - 1)), 3))
+        text = _consume(text, match)
+
+    for match in list(MONTH_PAIR_RE.finditer(text)):
+        start_month, end_month, year = _month(match.group(1)), _month(match.group(2)), int(match.group(3))
+        start_year = year - 1 if start_month > end_month else year
+        ranges.append((datetime(start_year, start_month, 1), datetime(year, end_month, 1)))
+        text = _consume(text, match)
+
+    for match in list(SINCE_MONTH_RE.finditer(text)):
+        ranges.append((datetime(int(match.group(2)), _month(match.group(1)), 1), today))
+        text = _consume(text, match)
+
+    for match in list(MONTH_YEAR_RE.finditer(text)):
+        month = datetime(int(match.group(2)), _month(match.group(1)), 1)
+        ranges.append((month, month))
+        text = _consume(text, match)
+
+    for match in list(YEAR_SPAN_RE.finditer(text)):
+        start_year = _fy_start_year(match.group(1), match.group(2))
+        if start_year is not None:
+            ranges.append(_span(datetime(start_year, 4, 1), 12))
+            text = _consume(text, match)
+
+    for match in list(RELATIVE_RE.finditer(text)):
+        count = match.group(1) or "1"
+        count = int(count) if count.isdigit() else NUMBER_WORDS[count.lower()]
+        unit = match.group(2).lower()
+        months = count * {"month": 1, "quarter": 3, "year": 12}[unit]
+        # "last month" is the previous month, whose figures are the latest released,
+        # so month and quarter ranges end there; "last N years" runs up to today as
+        # in the fetch_date prompt. Either way the range spans exactly N units.
+        end = today if unit == "year" else today - relativedelta(months=1)
+        ranges.append((end - relativedelta(months=months - 1), end))
+        text = _consume(text, match)
+
+    for match in list(SINCE_YEAR_RE.finditer(text)):
+        ranges.append((datetime(int(match.group(1)), 1, 1), today))
+        text = _consume(text, match)
+
+    for pattern in (YEAR_RE, TRAILING_YEAR_RE):
+        for match in list(pattern.finditer(text)):
+            year = int(match.group(1))
+            ranges.append((datetime(year, 1, 1), datetime(year, 12, 1)))
+            text = _consume(text, match)
+
+    if not ranges and NOW_RE.search(text):
+        ranges.append((today, today))
+
+    return ranges
+
+
+def parse_date_range(query: str, today: Optional[datetime] = None) -> Optional[Tuple[str, str]]:
+    """
+    Extracts the earliest and latest month referenced by a query.
+
+    Args:
+        query: Query text, typically the clarify_query rewrite.
+        today: Reference date for relative expressions. Defaults to now.
+
+    Returns:
+        (min_date, max_date) as "%B %Y" strings, capped at the current month,
+        or None if no date expression was recognised.
+    """
+    today = (today or datetime.today()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    ranges = _extract(query, today)
+    if not ranges:
+        return None
+    min_date = min(start for start, _ in ranges)
+    max_date = max(end for _, end in ranges)
+    # Same rule as the fetch_date prompt: never resolve to a date beyond the current month
+    max_date = min(max_date, today)
+    min_date = min(min_date, max_date)
+    return min_date.strftime("%B %Y"), max_date.strftime("%B %Y")
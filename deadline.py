@@ -0,0 +1,66 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# End-to-end budget for one search request, in seconds
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "15"))
+# Clients may ask for a different budget with this header, in seconds
+DEADLINE_HEADER = "X-Request-Deadline"
+
+
+def _parse_budgets(spec: str) -> dict:
+    budgets = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, share = part.split("=", 1)
+            budgets[name.strip()] = float(share)
+    return budgets
+
+
+# Share of the request deadline each preprocessing stage may take, e.g.
+# "llm_query=0.35,suggest_answer=0.3". A stage is also cut off when the
+# request deadline itself runs out.
+STAGE_BUDGETS = _parse_budgets(os.getenv(
+    "STAGE_BUDGETS",
+    "llm_query=0.35,plan=0.35,suggest_answer=0.3,query_date=0.2,query_min_date=0.2,key_terms=0.15",
+))
+
+
+# Absolute time.time() by which the code running in the current context must
+# finish. run_stages sets it for every stage with a timeout, including inside
+# executor threads, so blocking calls can bound their own timeouts and retries.
+call_deadline: ContextVar[Optional[float]] = ContextVar("call_deadline", default=None)
+
+
+def call_budget() -> Optional[float]:
+    """Seconds left before call_deadline, or None when no deadline is set."""
+    expires_at = call_deadline.get()
+    return None if expires_at is None else expires_at - time.time()
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.time() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.time())
+
+    def budget(self, stage: str) -> float:
+        return self.seconds * STAGE_BUDGETS.get(stage, 1.0)
+
+
+def request_deadline(headers, default: float = REQUEST_DEADLINE) -> Deadline:
+    """Deadline for a request, from the DEADLINE_HEADER header or `default` seconds."""
+    value = headers.get(DEADLINE_HEADER)
+    if value is not None:
+        try:
+            seconds = float(value)
+            if seconds > 0:
+                return Deadline(seconds)
+        except ValueError:
+            pass
+        logging.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+    return Deadline(default)
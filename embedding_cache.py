@@ -0,0 +1,257 @@
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+# Memory tier capacity, counting vector bytes plus key length
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+# Directory of the disk tier; empty disables it
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "")
+# Vectors kept by the disk tier (about 3 KB each for all-mpnet-base-v2)
+EMBEDDING_CACHE_DISK_SLOTS = int(os.getenv("EMBEDDING_CACHE_DISK_SLOTS", "100000"))
+# Slots a key may occupy in the disk tier; the least recently used one is replaced
+_DISK_WAYS = 8
+# Approximate per-entry bookkeeping overhead in the memory tier
+_ENTRY_OVERHEAD = 200
+
+def _record_dtype(dim):
+    return np.dtype([("digest", "<u8"), ("created", "<f8"), ("accessed", "<f8"), ("vector", "<f4", (dim,))])
+
+
+def _digest(key: str) -> int:
+    # Never 0, which marks an empty or in-flight slot
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class DiskTier:
+    """
+    Set-associative vector store on a memory-mapped .npy file of (digest,
+    created, accessed, vector) records. A key can live in one of _DISK_WAYS
+    slots chosen by its digest. Writers hold the directory's lock file while
+    they pick a slot and fill it: clear the digest, write the vector, then set
+    the digest. Without it, two processes could pick the same slot and leave
+    one key's digest on the other's vector. Readers take no lock; they check the
+    digest before and after copying, so at worst they miss a vector that is
+    being rewritten.
+
+    The file is never truncated or resized in place, which would crash every
+    process mapping it. It is created whole under a lock file and moved into
+    place with os.replace; processes still mapping a replaced file notice the
+    new inode and reopen.
+    """
+
+    def __init__(self, directory, slots, ttl):
+        self.directory = directory
+        self.slots = slots - slots % _DISK_WAYS or _DISK_WAYS
+        self.ttl = ttl
+        self._records = None
+        self._inode = None
+        os.makedirs(directory, exist_ok=True)
+        self._load(None)
+
+    def _path(self):
+        return os.path.join(self.directory, "vectors.npy")
+
+    def _load(self, dim):
+        """Maps the existing file if it has the expected layout; returns whether it did."""
+        path = self._path()
+        try:
+            before = os.stat(path).st_ino
+            records = np.load(path, mmap_mode="r+")
+            after = os.stat(path).st_ino
+        except (FileNotFoundError, ValueError):
+            return False
+        if before != after:
+            # Replaced while loading; the next call picks up the new file
+            return False
+        names = records.dtype.names or ()
+        if names != ("digest", "created", "accessed", "vector") or records.shape != (self.slots,):
+            return False
+        if dim is not None and records.dtype["vector"].shape != (dim,):
+            return False
+        self._records, self._inode = records, after
+        return True
+
+    @contextmanager
+    def _locked(self):
+        # Opened on every use: forked processes sharing one open file would share the lock too
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _create(self, dim):
+        with self._locked():
+            # Another process may have created it while this one waited for the lock
+            if self._load(dim):
+                return
+            if os.path.exists(self._path()):
+                logging.warning(f"Embedding disk cache in {self.directory} has a different layout, recreating it")
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".npy.tmp")
+            os.close(fd)
+            try:
+                records = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=_record_dtype(dim), shape=(self.slots,))
+                records.flush()
+                del records
+                os.replace(tmp_path, self._path())
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            self._load(dim)
+
+    def _refresh(self):
+        try:
+            inode = os.stat(self._path()).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            self._records, self._inode = None, None
+            if inode is not None:
+                self._load(None)
+
+    def _set(self, digest):
+        start = (digest % (self.slots // _DISK_WAYS)) * _DISK_WAYS
+        return range(start, start + _DISK_WAYS)
+
+    def get(self, key):
+        self._refresh()
+        if self._records is None:
+            return None
+        digest = _digest(key)
+        now = time.time()
+        records = self._records
+        for slot in self._set(digest):
+            if int(records["digest"][slot]) != digest:
+                continue
+            if now - float(records["created"][slot]) > self.ttl:
+                return None
+            vector = np.array(records["vector"][slot])
+            if int(records["digest"][slot]) != digest:
+                return None
+            records["accessed"][slot] = now
+            return vector
+        return None
+
+    def put(self, key, vector):
+        self._refresh()
+        if self._records is None or self._records.dtype["vector"].shape != vector.shape:
+            self._create(vector.shape[0])
+        records = self._records
+        digest = _digest(key)
+        slots = list(self._set(digest))
+        with self._locked():
+            matches = [slot for slot in slots if int(records["digest"][slot]) == digest]
+            slot = matches[0] if matches else slots[int(np.argmin(records["accessed"][slots]))]
+            now = time.time()
+            records["digest"][slot] = 0
+            records["vector"][slot] = vector
+            records["created"][slot] = now
+            records["accessed"][slot] = now
+            records["digest"][slot] = digest
+
+    def flush(self):
+        if self._records is not None:
+            self._records.flush()
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings, bounded by `max_bytes` and
+    entry age, with an optional persistent disk tier behind it. Memory misses
+    fall through to the disk tier, and disk hits are promoted back into memory.
+    """
+
+    def __init__(self, max_bytes=EMBEDDING_CACHE_MAX_BYTES, ttl=EMBEDDING_CACHE_TTL,
+                 directory=EMBEDDING_CACHE_DIR, disk_slots=EMBEDDING_CACHE_DISK_SLOTS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk = None
+        if directory:
+            try:
+                self._disk = DiskTier(directory, disk_slots, ttl)
+            except Exception as e:
+                logging.warning(f"Embedding disk cache disabled, could not open {directory}: {e}")
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_errors": 0}
+
+    @staticmethod
+    def _size(key, vector):
+        return vector.nbytes + len(key) + _ENTRY_OVERHEAD
+
+    def _store(self, key, vector, created):
+        # Caller holds self._lock
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= self._size(key, previous[0])
+        self._entries[key] = (vector, created)
+        self._bytes += self._size(key, vector)
+        while self._bytes > self.max_bytes and self._entries:
+            old_key, (old_vector, _) = self._entries.popitem(last=False)
+            self._bytes -= self._size(old_key, old_vector)
+            self._stats["evictions"] += 1
+
+    def get(self, key):
+        """Returns the cached vector for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                self._bytes -= self._size(key, entry[0])
+                del self._entries[key]
+            if self._disk is not None:
+                try:
+                    vector = self._disk.get(key)
+                except Exception as e:
+                    self._stats["disk_errors"] += 1
+                    logging.warning(f"Embedding disk cache read failed: {e}")
+                    vector = None
+                if vector is not None:
+                    self._store(key, vector, now)
+                    self._stats["disk_hits"] += 1
+                    return vector
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._store(key, vector, time.time())
+            if self._disk is not None:
+                try:
+                    self._disk.put(key, vector)
+                except Exception as e:
+                    self._stats["disk_errors"] += 1
+                    logging.warning(f"Embedding disk cache write failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._disk is not None:
+                self._disk.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+            stats["disk_enabled"] = self._disk is not None
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
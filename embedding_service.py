@@ -0,0 +1,47 @@
+import os
+
+import encoder
+from encoder import embedding_cache
+from inference_workers import MODEL_HOSTING, embedder_process
+from micro_batching import MicroBatcher
+
+# Concurrent query embeddings are encoded together, up to this many per forward pass
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+def encode_batch(texts):
+    if MODEL_HOSTING == "process":
+        return list(embedder_process(texts))
+    return list(encoder.model.encode(texts))
+
+
+embedding_batcher = MicroBatcher("embedder", encode_batch, EMBED_MAX_BATCH_SIZE, EMBED_MAX_WAIT_MS)
+
+
+async def embed_texts(texts):
+    """
+    Awaitable, batched counterpart of encoder.emb_text for a list of texts.
+    Cached texts are returned directly; the rest share a batch with other
+    concurrent callers.
+    """
+    found = {}
+    for text in dict.fromkeys(texts):
+        embedding = embedding_cache.get(text)
+        if embedding is not None:
+            found[text] = embedding
+    missing = [text for text in dict.fromkeys(texts) if text not in found]
+    if missing:
+        for text, embedding in zip(missing, await embedding_batcher.submit(missing)):
+            embedding_cache.put(text, embedding)
+            found[text] = embedding
+    return [found[text] for text in texts]
+
+
+async def embed_text(text: str):
+    return (await embed_texts([text]))[0]
+
+
+def get_embedding_stats() -> dict:
+    """Batch size and queue wait (seconds) of the embedding batcher, and embedding cache hit rates."""
+    return {**embedding_batcher.stats(), "cache": embedding_cache.stats()}
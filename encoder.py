@@ -1,25 +1,30 @@
-import streamlit as st
-from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
+from inference_backend import load_sentence_transformer
+from resources import cached_resource
 
 # Load the sentence transformer model once
-@st.cache_resource
+@cached_resource()
 def get_sentence_transformer():
-    return SentenceTransformer('sentence-transformers/all-mpnet-base-v2')  # or any other pre-trained model you prefer
+    return load_sentence_transformer()  # all-mpnet-base-v2 on the configured INFERENCE_BACKEND
 
-model = get_sentence_transformer()
+def __getattr__(name):
+    # `model` is loaded on first access, so processes that host it in an
+    # inference worker (MODEL_HOSTING=process) never load it themselves
+    if name == "model":
+        return get_sentence_transformer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Cache for embeddings
-@st.cache_resource
+@cached_resource(close=lambda cache: cache.close())
 def get_embedding_cache():
-    return {}
+    return EmbeddingCache()
 
 embedding_cache = get_embedding_cache()
 
 def emb_text(client, text: str):
-    if text in embedding_cache:
-        return embedding_cache[text]
-    else:
+    embedding = embedding_cache.get(text)
+    if embedding is None:
         # Use the sentence transformer model to encode the text
         embedding = client.encode(text)
-        embedding_cache[text] = embedding
-        return embedding
+        embedding_cache.put(text, embedding)
+    return embedding
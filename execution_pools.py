@@ -0,0 +1,32 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Network-bound work (Gemini, Milvus) mostly waits on sockets, so it gets a wider pool.
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))
+# Model inference is CPU-bound; more threads than cores only adds contention.
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(min(4, os.cpu_count() or 2))))
+
+io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io-pool")
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_POOL_SIZE, thread_name_prefix="cpu-pool")
+
+
+async def _run_in(pool, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Runs a blocking network call (Gemini, Milvus) on the I/O pool and awaits its result."""
+    return await _run_in(io_pool, fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Runs blocking model inference (SentenceTransformer, CrossEncoder) on the CPU pool."""
+    return await _run_in(cpu_pool, fn, *args, **kwargs)
+
+
+def shutdown_pools(wait: bool = True):
+    io_pool.shutdown(wait=wait)
+    cpu_pool.shutdown(wait=wait)
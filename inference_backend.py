@@ -0,0 +1,209 @@
+"""
+Model loading for the embedder and reranker, with a pluggable backend.
+
+INFERENCE_BACKEND=torch (default) loads the full-precision PyTorch models.
+INFERENCE_BACKEND=onnx loads a dynamically int8-quantized ONNX export through
+ONNX Runtime (requires optimum[onnxruntime]); the export is created under
+ONNX_MODEL_DIR on first use (once per host, under a lock file), or ahead of
+time with:
+
+    python inference_backend.py export
+
+Before switching a deployment, compare both backends with:
+
+    python inference_backend.py parity
+"""
+import argparse
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+# Quantization preset understood by sentence-transformers: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")
+
+EMBEDDING_MODEL = 'sentence-transformers/all-mpnet-base-v2'
+RERANKER_MODEL = "cross-encoder/ms-marco-TinyBERT-L-2-v2"
+
+# Models loaded by preload_models(), returned instead of loading a second copy
+_preloaded = {}
+
+
+def _quantized_file() -> str:
+    return f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+
+
+def _export_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+@contextmanager
+def _export_lock():
+    os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+    with open(os.path.join(ONNX_MODEL_DIR, ".export.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _is_exported(export_dir: str) -> bool:
+    return os.path.exists(os.path.join(export_dir, _quantized_file()))
+
+
+def export_quantized_onnx(model_cls, model_name: str, overwrite: bool = True) -> str:
+    """
+    Exports `model_name` to ONNX and writes a dynamically int8-quantized copy
+    next to it. Returns the export directory.
+
+    Processes sharing ONNX_MODEL_DIR export one at a time under a lock file.
+    Each export is written to a temporary directory and renamed into place, so
+    nobody loads a partially written model. With overwrite=False an existing
+    export is kept.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    export_dir = _export_dir(model_name)
+    with _export_lock():
+        if not overwrite and _is_exported(export_dir):
+            return export_dir
+        start = time.time()
+        tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=ONNX_MODEL_DIR)
+        try:
+            model = model_cls(model_name, backend="onnx", device="cpu")
+            model.save_pretrained(tmp_dir)
+            export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, tmp_dir)
+            if os.path.exists(export_dir):
+                # A directory can only be renamed over an empty one, so move the old export aside
+                old_dir = tempfile.mkdtemp(prefix=".old-", dir=ONNX_MODEL_DIR)
+                os.replace(export_dir, old_dir)
+                shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(tmp_dir, export_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    logging.info(f"Exported quantized ONNX model for {model_name} to {export_dir} in {time.time() - start:.4f} seconds")
+    return export_dir
+
+
+def _load(model_cls, model_name: str, backend: str):
+    if backend == "torch":
+        return model_cls(model_name, device="cpu")
+    if backend != "onnx":
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}, expected 'torch' or 'onnx'")
+    export_dir = _export_dir(model_name)
+    if not _is_exported(export_dir):
+        export_quantized_onnx(model_cls, model_name, overwrite=False)
+    return model_cls(export_dir, backend="onnx", device="cpu", model_kwargs={"file_name": _quantized_file()})
+
+
+def load_sentence_transformer(backend: str = None):
+    if backend is None and "embedder" in _preloaded:
+        return _preloaded["embedder"]
+    from sentence_transformers import SentenceTransformer
+    return _load(SentenceTransformer, EMBEDDING_MODEL, backend or INFERENCE_BACKEND)
+
+
+def load_cross_encoder(backend: str = None):
+    if backend is None and "reranker" in _preloaded:
+        return _preloaded["reranker"]
+    from sentence_transformers import CrossEncoder
+    return _load(CrossEncoder, RERANKER_MODEL, backend or INFERENCE_BACKEND)
+
+
+def preload_models():
+    """
+    Loads both models into this process so that later load_* calls, including
+    those in processes forked from it, reuse them instead of loading copies.
+    """
+    start = time.time()
+    _preloaded["embedder"] = load_sentence_transformer()
+    _preloaded["reranker"] = load_cross_encoder()
+    logging.info(f"Preloaded embedder and reranker in {time.time() - start:.4f} seconds")
+
+
+def _spearman(a, b) -> float:
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    if len(a) < 2:
+        return 1.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def parity_check(texts, queries) -> dict:
+    """
+    Compares the ONNX backend against PyTorch.
+
+    Embeddings: cosine drift (1 - cosine similarity) per text, and Spearman
+    agreement of the similarity ranking each text induces over the others.
+    Reranker: Spearman agreement of each query's scores over `texts` and
+    whether the top-ranked passage matches.
+    """
+    reference = load_sentence_transformer("torch").encode(texts, normalize_embeddings=True)
+    candidate = load_sentence_transformer("onnx").encode(texts, normalize_embeddings=True)
+    drift = 1 - np.sum(reference * candidate, axis=1)
+    similarity_ref = reference @ reference.T
+    similarity_cand = candidate @ candidate.T
+    embed_rank = [
+        _spearman(np.delete(similarity_ref[i], i), np.delete(similarity_cand[i], i))
+        for i in range(len(texts))
+    ]
+
+    reference_ce = load_cross_encoder("torch")
+    candidate_ce = load_cross_encoder("onnx")
+    rerank_rank = []
+    top1_agreement = []
+    for query in queries:
+        pairs = [(query, text) for text in texts]
+        scores_ref = reference_ce.predict(pairs)
+        scores_cand = candidate_ce.predict(pairs)
+        rerank_rank.append(_spearman(scores_ref, scores_cand))
+        top1_agreement.append(int(np.argmax(scores_ref) == np.argmax(scores_cand)))
+
+    return {
+        "embedding_cosine_drift_mean": float(np.mean(drift)),
+        "embedding_cosine_drift_max": float(np.max(drift)),
+        "embedding_rank_agreement": float(np.mean(embed_rank)),
+        "rerank_rank_agreement": float(np.mean(rerank_rank)),
+        "rerank_top1_agreement": float(np.mean(top1_agreement)),
+    }
+
+
+SAMPLE_TEXTS = [
+    "CPI inflation in India eased to 2.1 per cent in June 2025, driven by lower food prices.",
+    "The Reserve Bank of India kept the repo rate unchanged at 6.5 per cent.",
+    "Index of Industrial Production grew 4.2 per cent year-on-year, led by manufacturing.",
+    "Maharashtra had the highest GSDP among Indian states in 2023-24.",
+    "Food and beverages inflation fell as vegetable prices declined.",
+    "The fiscal deficit for FY25 was budgeted at 4.9 per cent of GDP.",
+    "Agriculture contributes about 18 per cent to India's gross value added.",
+    "Wholesale price inflation turned negative in May 2025.",
+]
+SAMPLE_QUERIES = [
+    "CPI inflation in India June 2025",
+    "RBI repo rate decision",
+    "Top states by GSDP",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "parity"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        from sentence_transformers import CrossEncoder, SentenceTransformer
+        export_quantized_onnx(SentenceTransformer, EMBEDDING_MODEL)
+        export_quantized_onnx(CrossEncoder, RERANKER_MODEL)
+    else:
+        for metric, value in parity_check(SAMPLE_TEXTS, SAMPLE_QUERIES).items():
+            print(f"{metric}: {value:.4f}")
@@ -0,0 +1,184 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# "inline" runs the models inside the server process, "process" hosts each one in
+# a dedicated worker process and exchanges inputs/outputs through shared memory.
+MODEL_HOSTING = os.getenv("MODEL_HOSTING", "inline")
+# Torch threads per worker process, i.e. the number of cores each model may use
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "1"))
+INFERENCE_WORKER_START_TIMEOUT = float(os.getenv("INFERENCE_WORKER_START_TIMEOUT", "300"))
+
+_OFFSET_DTYPE = np.int64
+
+
+def _pack_strings(strings, buf=None):
+    """
+    Lays out strings as an int64 offset table followed by their UTF-8 bytes.
+    Returns the number of bytes needed, writing into `buf` when it is given.
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=_OFFSET_DTYPE)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    header = offsets.nbytes
+    needed = header + int(offsets[-1])
+    if buf is not None:
+        buf[:header] = offsets.tobytes()
+        buf[header:needed] = b"".join(encoded)
+    return needed
+
+
+def _unpack_strings(buf, n_strings):
+    header = (n_strings + 1) * np.dtype(_OFFSET_DTYPE).itemsize
+    offsets = np.frombuffer(buf, dtype=_OFFSET_DTYPE, count=n_strings + 1)
+    data = bytes(buf[header:header + int(offsets[-1])])
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+
+
+def _worker_main(conn, loader_path, method, threads):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    module_name, fn_name = loader_path.split(":")
+    model = getattr(importlib.import_module(module_name), fn_name)()
+    run = getattr(model, method)
+    conn.send(("ready", None))
+
+    inputs_shm = None
+    outputs_shm = None
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            _, shm_name, n_strings, pairs = message
+            try:
+                if inputs_shm is None or inputs_shm.name != shm_name:
+                    if inputs_shm is not None:
+                        inputs_shm.close()
+                    inputs_shm = shared_memory.SharedMemory(name=shm_name)
+                strings = _unpack_strings(inputs_shm.buf, n_strings)
+                if pairs:
+                    strings = list(zip(strings[0::2], strings[1::2]))
+                result = np.ascontiguousarray(run(strings), dtype=np.float32)
+
+                if outputs_shm is None or outputs_shm.size < result.nbytes:
+                    if outputs_shm is not None:
+                        outputs_shm.close()
+                        outputs_shm.unlink()
+                    outputs_shm = shared_memory.SharedMemory(create=True, size=max(result.nbytes, 1 << 20))
+                np.ndarray(result.shape, dtype=np.float32, buffer=outputs_shm.buf)[...] = result
+                conn.send(("ok", (outputs_shm.name, result.shape)))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+    finally:
+        if inputs_shm is not None:
+            inputs_shm.close()
+        if outputs_shm is not None:
+            outputs_shm.close()
+            outputs_shm.unlink()
+
+
+class ModelProcess:
+    """
+    Hosts one model in a dedicated process so inference does not compete with
+    the server for the GIL. Only small control messages go through the pipe;
+    input strings and float32 outputs are exchanged through shared memory.
+
+    Calls are blocking and serialized per process; run them on the CPU pool.
+    """
+
+    def __init__(self, name, loader_path, method, pairs=False, threads=INFERENCE_WORKER_THREADS):
+        self.name = name
+        self.loader_path = loader_path
+        self.method = method
+        self.pairs = pairs
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._inputs_shm = None
+        self._outputs_shm = None
+
+    def start(self):
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        start = time.time()
+        # spawn, not fork: the child must not inherit the server's torch threads or sockets
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.loader_path, self.method, self.threads),
+            name=f"inference-{self.name}",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if not self._conn.poll(INFERENCE_WORKER_START_TIMEOUT):
+            raise RuntimeError(f"Inference worker {self.name} did not start within {INFERENCE_WORKER_START_TIMEOUT} seconds")
+        self._conn.recv()
+        logging.info(f"Inference worker {self.name} (pid {self._process.pid}) ready in {time.time() - start:.4f} seconds")
+
+    def _inputs_buffer(self, needed):
+        if self._inputs_shm is None or self._inputs_shm.size < needed:
+            if self._inputs_shm is not None:
+                self._inputs_shm.close()
+                self._inputs_shm.unlink()
+            self._inputs_shm = shared_memory.SharedMemory(create=True, size=max(needed, 1 << 20))
+        return self._inputs_shm
+
+    def __call__(self, inputs):
+        strings = [s for pair in inputs for s in pair] if self.pairs else list(inputs)
+        with self._lock:
+            self._start()
+            shm = self._inputs_buffer(_pack_strings(strings))
+            _pack_strings(strings, shm.buf)
+            self._conn.send(("run", shm.name, len(strings), self.pairs))
+            status, payload = self._conn.recv()
+            if status != "ok":
+                raise RuntimeError(f"Inference worker {self.name} failed: {payload}")
+            shm_name, shape = payload
+            if self._outputs_shm is None or self._outputs_shm.name != shm_name:
+                if self._outputs_shm is not None:
+                    self._outputs_shm.close()
+                self._outputs_shm = shared_memory.SharedMemory(name=shm_name)
+            # Copy out: the worker reuses the buffer for the next call
+            return np.ndarray(shape, dtype=np.float32, buffer=self._outputs_shm.buf).copy()
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                self._conn.send(("stop",))
+                self._process.join(timeout=10)
+            if self._outputs_shm is not None:
+                self._outputs_shm.close()
+                self._outputs_shm = None
+            if self._inputs_shm is not None:
+                self._inputs_shm.close()
+                self._inputs_shm.unlink()
+                self._inputs_shm = None
+            self._process = None
+
+
+embedder_process = ModelProcess("embedder", "inference_backend:load_sentence_transformer", "encode")
+reranker_process = ModelProcess("reranker", "inference_backend:load_cross_encoder", "predict", pairs=True)
+
+
+def shutdown_workers():
+    embedder_process.close()
+    reranker_process.close()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from time import strftime, gmtime
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+# SQLite file shared by every worker on the host
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+# Expired and overflow rows are pruned once every this many writes
+_PRUNE_EVERY = 200
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+_writes_since_prune = 0
+
+
+def _connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(LLM_CACHE_PATH, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                name TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _bump(stat: str):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def _json_default(value):
+    # Pydantic response schemas are hashed by their JSON schema, not their repr
+    if hasattr(value, "model_json_schema"):
+        return value.model_json_schema()
+    return str(value)
+
+
+def make_key(model: str, config, contents) -> str:
+    """
+    Content address for a call: a hash of the model, the full generation config
+    (system instruction, tools, temperature, response schema) and the input.
+    """
+    payload = {
+        "model": model,
+        "config": config.model_dump(exclude_none=True),
+        "contents": contents,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=_json_default).encode("utf-8")).hexdigest()
+
+
+def is_cacheable(config) -> bool:
+    return LLM_CACHE_ENABLED and config.temperature == 0.0
+
+
+def _next_month_start(now: float) -> float:
+    today = datetime.fromtimestamp(now, tz=timezone.utc)
+    if today.month == 12:
+        rollover = datetime(today.year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        rollover = datetime(today.year, today.month + 1, 1, tzinfo=timezone.utc)
+    return rollover.timestamp()
+
+
+def expiry_for(config, now: float) -> float:
+    """
+    Prompts that embed the current month (`curdate`) resolve "today" and
+    "last year" relative to it, so their answers expire at the month rollover
+    regardless of the configured TTL.
+    """
+    expires_at = now + LLM_CACHE_TTL
+    curdate = strftime("%Y-%m", gmtime(now))
+    if curdate in str(config.system_instruction or ""):
+        expires_at = min(expires_at, _next_month_start(now))
+    return expires_at
+
+
+def get(key: str):
+    try:
+        now = time.time()
+        conn = _connection()
+        row = conn.execute(
+            "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            _bump("misses")
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _bump("hits")
+        return row[0]
+    except sqlite3.Error as e:
+        _bump("errors")
+        logging.warning(f"LLM cache read failed: {e}")
+        return None
+
+
+def put(key: str, name: str, response: str, expires_at: float):
+    global _writes_since_prune
+    try:
+        now = time.time()
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, name, response, created_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, name, response, now, expires_at, now),
+        )
+        conn.commit()
+        _bump("writes")
+        with _stats_lock:
+            _writes_since_prune += 1
+            prune_now = _writes_since_prune >= _PRUNE_EVERY
+            if prune_now:
+                _writes_since_prune = 0
+        if prune_now:
+            prune(conn, now)
+    except sqlite3.Error as e:
+        _bump("errors")
+        logging.warning(f"LLM cache write failed: {e}")
+
+
+def prune(conn: sqlite3.Connection, now: float):
+    """Drops expired rows, then the least recently used rows beyond LLM_CACHE_MAX_ENTRIES."""
+    conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+    conn.execute(
+        """DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+        )""",
+        (LLM_CACHE_MAX_ENTRIES,),
+    )
+    conn.commit()
+
+
+def get_cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
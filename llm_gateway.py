@@ -0,0 +1,231 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from google import genai
+from google.genai import errors, types
+
+import llm_cache
+from circuit_breaker import CircuitBreaker, CircuitBreakerOpen
+from deadline import call_budget
+
+# Per-call timeout for Gemini requests, in seconds
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Maximum number of Gemini calls in flight from this process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# The circuit breaker opens once LLM_BREAKER_FAILURE_RATE of the attempts in the
+# last LLM_BREAKER_WINDOW seconds failed, counting retries, provided there were at
+# least LLM_BREAKER_MIN_CALLS attempts. Attempts cut short by the caller's deadline
+# are not counted either way.
+LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "30"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+# Seconds between recovery probes while the breaker is open
+LLM_BREAKER_PROBE_INTERVAL = float(os.getenv("LLM_BREAKER_PROBE_INTERVAL", "30"))
+LLM_BREAKER_PROBE_MODEL = os.getenv("LLM_BREAKER_PROBE_MODEL", "gemini-2.0-flash")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+_metrics_lock = threading.Lock()
+_metrics = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "total_latency": 0.0, "max_latency": 0.0})
+
+
+def get_client() -> genai.Client:
+    """
+    Returns the process-wide Gemini client. The client keeps its HTTP connection
+    pool alive between calls, so only the first request pays for the TLS handshake.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(
+                    api_key=os.getenv("GOOGLE_API_KEY"),
+                    http_options=types.HttpOptions(timeout=int(LLM_TIMEOUT * 1000)),
+                )
+    return _client
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, errors.APIError):
+        return e.code in RETRYABLE_STATUS_CODES
+    return isinstance(e, (TimeoutError, ConnectionError)) or type(e).__module__.startswith("httpx")
+
+
+def _is_timeout(e: Exception) -> bool:
+    return isinstance(e, TimeoutError) or (type(e).__module__.startswith("httpx") and "Timeout" in type(e).__name__)
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter keeps concurrent retries from hammering the quota in lockstep
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class LLMUnavailableError(CircuitBreakerOpen):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+
+class LLMBudgetExhausted(TimeoutError):
+    """
+    Raised when the caller's deadline runs out before or during an attempt.
+    Unlike other timeouts it does not count as a provider failure.
+    """
+
+
+def _probe():
+    get_client().models.generate_content(
+        model=LLM_BREAKER_PROBE_MODEL,
+        config=types.GenerateContentConfig(max_output_tokens=1, temperature=0.0),
+        contents="ping",
+    )
+
+
+breaker = CircuitBreaker(
+    "LLM",
+    _probe,
+    window=LLM_BREAKER_WINDOW,
+    min_calls=LLM_BREAKER_MIN_CALLS,
+    failure_rate=LLM_BREAKER_FAILURE_RATE,
+    probe_interval=LLM_BREAKER_PROBE_INTERVAL,
+    error=LLMUnavailableError,
+)
+
+
+def llm_available() -> bool:
+    """False while the circuit breaker is open and callers should skip the LLM."""
+    return not breaker.is_open
+
+
+def _record(name: str, latency: float, retries: int, failed: bool):
+    with _metrics_lock:
+        entry = _metrics[name]
+        entry["calls"] += 1
+        entry["retries"] += retries
+        entry["errors"] += int(failed)
+        entry["total_latency"] += latency
+        entry["max_latency"] = max(entry["max_latency"], latency)
+
+
+def _attempt(model: str, config: types.GenerateContentConfig, contents):
+    budget = call_budget()
+    if budget is None:
+        # The slot is only held for the call itself, not while backing off
+        with _slots:
+            return get_client().models.generate_content(model=model, config=config, contents=contents)
+    if budget <= 0 or not _slots.acquire(timeout=budget):
+        raise LLMBudgetExhausted("No time left in the caller's deadline for an LLM call")
+    try:
+        # Cut the HTTP timeout down to what is left of the caller's budget
+        budget = call_budget()
+        if budget <= 0:
+            raise LLMBudgetExhausted("No time left in the caller's deadline for an LLM call")
+        timeout = min(LLM_TIMEOUT, budget)
+        config = (config or types.GenerateContentConfig()).model_copy(
+            update={"http_options": types.HttpOptions(timeout=max(1, int(timeout * 1000)))}
+        )
+        try:
+            return get_client().models.generate_content(model=model, config=config, contents=contents)
+        except Exception as e:
+            if timeout < LLM_TIMEOUT and _is_timeout(e):
+                # Timed out because the caller allowed less than LLM_TIMEOUT, which
+                # says nothing about the provider's health
+                raise LLMBudgetExhausted(f"LLM call exceeded the caller's remaining {timeout:.2f} seconds") from e
+            raise
+    finally:
+        _slots.release()
+
+
+def generate_content(name: str, model: str, config: types.GenerateContentConfig, contents):
+    """
+    Calls Gemini through the shared client with a concurrency cap and jittered
+    exponential backoff on throttling, server errors and timeouts.
+
+    When called from a stage with a timeout (deadline.call_deadline is set),
+    waiting for a slot and each attempt's HTTP timeout are cut to the time
+    left, and there is no retry once backing off would use it up, so the
+    calling thread is freed when the stage times out.
+
+    Args:
+        name: Label for the calling helper, used for logging and metrics.
+        model: Gemini model name.
+        config: GenerateContentConfig for the call.
+        contents: Prompt contents.
+
+    Returns:
+        The GenerateContentResponse from the model.
+
+    Raises:
+        LLMUnavailableError: if the circuit breaker is open.
+    """
+    breaker.check(name)
+    start = time.time()
+    retries = 0
+    while True:
+        try:
+            response = _attempt(model, config, contents)
+            break
+        except Exception as e:
+            # Provider errors and timeouts after the full LLM_TIMEOUT count against
+            # the provider; attempts cut short by the caller's deadline do not, since
+            # clients choose that deadline (X-Request-Deadline)
+            if _is_retryable(e) and not isinstance(e, LLMBudgetExhausted):
+                breaker.record_failure()
+            delay = _backoff(retries)
+            budget = call_budget()
+            # Give up when backing off would already use up the caller's budget
+            out_of_time = budget is not None and delay >= budget
+            if retries >= LLM_MAX_RETRIES or not _is_retryable(e) or out_of_time:
+                latency = time.time() - start
+                _record(name, latency, retries, failed=True)
+                logging.error(f"LLM call {name} failed after {retries} retries in {latency:.4f} seconds: {e}")
+                raise
+            retries += 1
+            logging.warning(f"LLM call {name} failed ({e}), retry {retries}/{LLM_MAX_RETRIES} in {delay:.2f} seconds")
+            time.sleep(delay)
+    latency = time.time() - start
+    breaker.record_success()
+    _record(name, latency, retries, failed=False)
+    logging.info(f"LLM call {name} completed in {latency:.4f} seconds ({retries} retries)")
+    return response
+
+
+def generate_text(name: str, model: str, config: types.GenerateContentConfig, contents, cache: bool = False) -> str:
+    """
+    Same as generate_content but returns the response text. With cache=True,
+    deterministic (temperature 0) calls are served from the persistent LLM cache
+    when an identical call was answered before.
+    """
+    use_cache = cache and llm_cache.is_cacheable(config)
+    if use_cache:
+        key = llm_cache.make_key(model, config, contents)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            logging.info(f"LLM call {name} served from cache")
+            return cached
+    text = generate_content(name, model, config, contents).text
+    if use_cache and text:
+        llm_cache.put(key, name, text, llm_cache.expiry_for(config, time.time()))
+    return text
+
+
+def get_llm_metrics() -> dict:
+    """Returns per-helper call counts, errors, retries and latency in seconds."""
+    with _metrics_lock:
+        return {
+            name: {
+                **entry,
+                "avg_latency": entry["total_latency"] / entry["calls"] if entry["calls"] else 0.0,
+            }
+            for name, entry in _metrics.items()
+        }
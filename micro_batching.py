@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import threading
+import time
+
+from execution_pools import run_cpu
+
+
+class MicroBatcher:
+    """
+    Merges inputs submitted by concurrent requests into one call of `batch_fn`.
+
+    The first submission opens a batch; further submissions join it until it
+    holds `max_batch_size` inputs or `max_wait_ms` has passed. `batch_fn` receives
+    the concatenated inputs on the CPU pool and must return one output per input,
+    in order. Each caller gets back exactly the outputs for its own inputs.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=64, max_wait_ms=5.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._carry = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "inputs": 0, "requests": 0, "max_batch_size": 0, "total_queue_wait": 0.0, "total_batch_time": 0.0}
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._carry = None
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, inputs):
+        """
+        Queues inputs for the next batch and returns their outputs as a list.
+        More than max_batch_size inputs are submitted as consecutive chunks, so
+        other callers' requests get batched in between instead of waiting for
+        one oversized batch.
+        """
+        inputs = list(inputs)
+        if not inputs:
+            return []
+        self._ensure_worker()
+        outputs = []
+        for start in range(0, len(inputs), self.max_batch_size):
+            future = self._loop.create_future()
+            await self._queue.put((inputs[start:start + self.max_batch_size], future, time.time()))
+            outputs.extend(await future)
+        return outputs
+
+    async def _collect(self):
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self._queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = time.time() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if size + len(entry[0]) > self.max_batch_size:
+                # Requests are never split; an oversized one opens the next batch instead
+                self._carry = entry
+                break
+            batch.append(entry)
+            size += len(entry[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            inputs = [x for entry_inputs, _, _ in batch for x in entry_inputs]
+            batch_start = time.time()
+            try:
+                outputs = list(await run_cpu(self.batch_fn, inputs))
+            except Exception as e:
+                logging.error(f"{self.name} batch of {len(inputs)} failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            batch_time = time.time() - batch_start
+            self._record(batch, len(inputs), batch_start, batch_time)
+
+            offset = 0
+            for entry_inputs, future, _ in batch:
+                if not future.done():
+                    future.set_result(outputs[offset:offset + len(entry_inputs)])
+                offset += len(entry_inputs)
+
+    def _record(self, batch, n_inputs, batch_start, batch_time):
+        queue_wait = sum(batch_start - queued_at for _, _, queued_at in batch)
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["inputs"] += n_inputs
+            self._stats["requests"] += len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], n_inputs)
+            self._stats["total_queue_wait"] += queue_wait
+            self._stats["total_batch_time"] += batch_time
+        logging.info(f"{self.name} ran batch of {n_inputs} inputs from {len(batch)} requests in {batch_time:.4f} seconds")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = stats["inputs"] / stats["batches"] if stats["batches"] else 0.0
+        stats["avg_queue_wait"] = stats["total_queue_wait"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
@@ -1,8 +1,9 @@
-import streamlit as st
 from pymilvus import MilvusClient
 
+from resources import cached_resource
 
-@st.cache_resource
+
+@cached_resource(close=lambda client: client.close())
 def get_milvus_client(uri: str, token: str = None) -> MilvusClient:
     client = MilvusClient(uri=uri, token=token)
     client.using_database("tata_db")  # Switch to tata_db
@@ -1,14 +1,25 @@
-import streamlit as st
 from pymilvus import MilvusClient
 
+from resources import cached_resource
 
-@st.cache_resource
+
+@cached_resource(close=lambda client: client.close())
 def get_milvus_client(uri: str, token: str = None) -> MilvusClient:
     client = MilvusClient(uri=uri, token=token)
     client.using_database("tata_db")  # Switch to tata_db
     return client
 
 
+def get_collection_version(milvus_client: MilvusClient, collection_name: str) -> str:
+    """
+    Cheap fingerprint of a collection's contents: its id (changes when it is
+    dropped and recreated) and its row count (changes on insert or delete).
+    """
+    description = milvus_client.describe_collection(collection_name)
+    stats = milvus_client.get_collection_stats(collection_name)
+    return f"{description.get('collection_id')}:{stats.get('row_count')}"
+
+
 def create_collection(
     milvus_client: MilvusClient, collection_name: str, dim: int, drop_old: bool = True
 ):
@@ -28,7 +39,7 @@ def create_collection(
 
 
 def get_search_results(milvus_client, collection_name, query_vector, output_fields=["id", "source", "page", "content", "reference", "date"],
-                       date_filter = None, bin_size = 1):     # e.g., "2024-12-31"):
+                       date_filter = None, bin_size = 1, limit = None):     # e.g., "2024-12-31"):
     # Build filter expression
     #start_date = "December 2023"
     #end_date = "February 2024"
@@ -43,7 +54,7 @@ def get_search_results(milvus_client, collection_name, query_vector, output_fiel
     search_res = milvus_client.search(
         collection_name=collection_name,
         data=[query_vector],
-        limit=max(10,30 - 5*bin_size),
+        limit=limit or max(10,30 - 5*bin_size),
         search_params={"metric_type": "COSINE", "params": {}},  # Using COSINE metric for embeddings
         output_fields=output_fields, # Use valid field names here
         group_by_field='reference',
@@ -53,6 +64,25 @@ def get_search_results(milvus_client, collection_name, query_vector, output_fiel
     )
     return search_res
 
+def get_search_results_batch(milvus_client, collection_name, query_vectors, output_fields=["id", "source", "page", "content", "reference", "date"],
+                             date_filter = None, bin_size = 1, limit = None):
+    """
+    Same search as get_search_results for several query vectors sharing one
+    date filter, sent as a single request (nq > 1). Returns one hit list per vector.
+    """
+    search_res = milvus_client.search(
+        collection_name=collection_name,
+        data=list(query_vectors),
+        limit=limit or max(10,30 - 5*bin_size),
+        search_params={"metric_type": "COSINE", "params": {}},
+        output_fields=output_fields,
+        group_by_field='reference',
+        group_size=4,
+        strict_group_size=False,
+        filter=date_filter
+    )
+    return search_res
+
 def get_chunks_by_reference_page_pairs(
     milvus_client,
     collection_name,
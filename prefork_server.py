@@ -0,0 +1,142 @@
+"""
+Pre-forking server: loads the embedder and reranker once, then forks worker
+processes that serve the app on a shared listening socket. The weights are
+shared copy-on-write between workers, so N workers need roughly the model
+memory of one. The app module itself (and with it the Milvus client, the
+Gemini client and the thread pools) is only imported inside each worker,
+after the fork.
+
+Usage:
+    python prefork_server.py cpi_top5_results_v6_vm_experimental_citeurl:app --workers 2 --port 8000
+
+Models are only preloaded for INFERENCE_BACKEND=torch with MODEL_HOSTING=inline;
+ONNX Runtime sessions do not survive a fork, so with the onnx backend every
+worker loads its own copy.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# Workers to fork; keep within the container's CPU limit
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "2"))
+# Seconds to wait before replacing a worker that exited unexpectedly
+WORKER_RESPAWN_DELAY = float(os.getenv("WORKER_RESPAWN_DELAY", "1"))
+
+
+def _listen(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _reset_logging():
+    # The master's basicConfig would make the app's own logging.basicConfig (log
+    # file, DEBUG level) a no-op in the workers
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(logging.WARNING)
+
+
+def _serve(app, sock, threads):
+    _reset_logging()
+    # Each worker gets its share of the cores for inference
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def _fork_worker(app, sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        status = 0
+        try:
+            _serve(app, sock, threads)
+        except Exception:
+            logging.exception(f"Worker {os.getpid()} failed")
+            status = 1
+        finally:
+            os._exit(status)
+    logging.info(f"Started worker {pid}")
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", help="Import string of the ASGI app, e.g. module:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.path.insert(0, os.getcwd())
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    threads = max(1, cores // args.workers)
+    # Read by execution_pools when the app is imported in each worker
+    os.environ.setdefault("CPU_POOL_SIZE", str(threads))
+    # Tokenizer threads started before the fork would be lost in the workers
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    from inference_backend import INFERENCE_BACKEND, preload_models
+    from inference_workers import MODEL_HOSTING
+    if INFERENCE_BACKEND == "torch" and MODEL_HOSTING == "inline":
+        preload_models()
+    else:
+        logging.info(f"Not preloading models (INFERENCE_BACKEND={INFERENCE_BACKEND}, MODEL_HOSTING={MODEL_HOSTING})")
+    # Keep the garbage collector from touching, and so un-sharing, objects created so far
+    gc.collect()
+    gc.freeze()
+
+    sock = _listen(args.host, args.port)
+    logging.info(f"Listening on {args.host}:{args.port} with {args.workers} workers, {threads} threads each")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    workers = set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        workers.add(_fork_worker(args.app, sock, threads))
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logging.warning(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(WORKER_RESPAWN_DELAY)
+            workers.add(_fork_worker(args.app, sock, threads))
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import functools
+import hashlib
+import logging
+import threading
+import time
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of expensive shared objects (models, clients).
+
+    Each resource is built by its factory on first use, exactly once even when
+    several threads ask for it at the same time, and the time its construction
+    took is recorded. shutdown() releases every built resource with its close
+    function, newest first. Usable from FastAPI, Streamlit or plain scripts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._order = []
+
+    def _entry(self, name, factory, close, label):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = {"factory": factory, "close": close, "label": label or name, "lock": threading.Lock(), "value": None, "ready": False, "init_time": None}
+                self._entries[name] = entry
+            return entry
+
+    def get(self, name, factory, close=None, label=None):
+        """
+        Returns the resource called `name`, building it with factory() on first
+        use. `label` is what logs and stats() show instead of `name`; pass one
+        whenever `name` is derived from values that must not be exposed.
+        """
+        entry = self._entry(name, factory, close, label)
+        if entry["ready"]:
+            return entry["value"]
+        with entry["lock"]:
+            if not entry["ready"]:
+                start = time.time()
+                entry["value"] = entry["factory"]()
+                entry["init_time"] = time.time() - start
+                entry["ready"] = True
+                with self._lock:
+                    self._order.append(name)
+                logging.info(f"Initialized resource {entry['label']} in {entry['init_time']:.4f} seconds")
+        return entry["value"]
+
+    def shutdown(self):
+        """Closes every built resource, newest first. They are rebuilt if requested again."""
+        with self._lock:
+            order, self._order = self._order, []
+        for name in reversed(order):
+            entry = self._entries[name]
+            with entry["lock"]:
+                value, entry["value"], entry["ready"] = entry["value"], None, False
+                if entry["close"] is not None:
+                    try:
+                        entry["close"](value)
+                    except Exception as e:
+                        logging.warning(f"Closing resource {entry['label']} failed: {e}")
+            logging.info(f"Released resource {entry['label']}")
+
+    def stats(self) -> dict:
+        """Per-label instance counts and init times (seconds)."""
+        stats = {}
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            label_stats = stats.setdefault(entry["label"], {"instances": 0, "initialized": 0, "init_time": 0.0})
+            label_stats["instances"] += 1
+            if entry["ready"]:
+                label_stats["initialized"] += 1
+                label_stats["init_time"] = max(label_stats["init_time"], entry["init_time"])
+        return stats
+
+
+registry = ResourceRegistry()
+
+
+def cached_resource(close=None):
+    """
+    Decorator that turns a factory into a registry-backed singleton per distinct
+    argument tuple, like st.cache_resource but independent of Streamlit.
+    Arguments (which may include credentials) only enter the key as a hash;
+    logs and stats show the factory's qualified name.
+    """
+    def decorator(factory):
+        label = factory.__module__ + "." + factory.__qualname__
+
+        @functools.wraps(factory)
+        def wrapper(*args, **kwargs):
+            name = label
+            if args or kwargs:
+                name += "#" + hashlib.sha256(repr((args, tuple(sorted(kwargs.items())))).encode("utf-8")).hexdigest()
+            return registry.get(name, lambda: factory(*args, **kwargs), close, label)
+        return wrapper
+    return decorator
@@ -0,0 +1,97 @@
+import copy
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+# How often the collection is polled for changes, in seconds
+RESPONSE_CACHE_VERSION_CHECK = float(os.getenv("RESPONSE_CACHE_VERSION_CHECK", "60"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases, replaces punctuation with spaces and collapses whitespace."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of full /search-topN responses keyed by normalized
+    question. Entries expire after `ttl` seconds, at the end of the month (the
+    pipeline resolves "latest" against the current month), or as soon as the
+    collection version changes.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._stats = {"hits": 0, "misses": 0, "bypasses": 0, "writes": 0, "invalidations": 0}
+
+    def _key(self, question):
+        return (datetime.today().strftime("%Y-%m"), normalize_question(question))
+
+    def get(self, question):
+        key = self._key(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return copy.deepcopy(entry[1])
+
+    @property
+    def version(self):
+        return self._version
+
+    def put(self, question, response, version=None):
+        """
+        Stores a response. `version` is the collection version seen when the
+        request started; the response is dropped if the collection changed since.
+        """
+        key = self._key(question)
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (time.time() + self.ttl, copy.deepcopy(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stats["writes"] += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def set_version(self, version):
+        """Drops every entry when the collection version differs from the last one seen."""
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logging.info(f"Collection changed ({self._version} -> {version}), dropping {len(self._entries)} cached responses")
+                self._entries.clear()
+                self._stats["invalidations"] += 1
+            self._version = version
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["version"] = self._version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,121 @@
+import copy
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+# Minimum cosine similarity between raw questions for a rewrite to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+
+_MONTHS = {
+    "jan": "january", "feb": "february", "mar": "march", "apr": "april", "may": "may", "jun": "june",
+    "jul": "july", "aug": "august", "sep": "september", "sept": "september", "oct": "october",
+    "nov": "november", "dec": "december",
+}
+_MONTHS.update({name: name for name in _MONTHS.values()})
+# Words that shift the resolved date window even without an explicit date
+_RELATIVE = {"latest", "current", "recent", "last", "previous", "past", "since", "till", "until", "ytd", "today"}
+_TOKEN = re.compile(r"[a-z]+|\d+")
+
+
+def temporal_tokens(question: str) -> frozenset:
+    """
+    Month names (abbreviations folded to full names), numbers (years, fiscal
+    years, counts as in "last 6 months"), quarter/half markers and relative
+    date words. Questions whose sets differ never share a cache entry.
+    """
+    tokens = set()
+    for token in _TOKEN.findall(question.lower()):
+        if token in _MONTHS:
+            tokens.add(_MONTHS[token])
+        elif token.isdigit() or token in _RELATIVE or token == "fy":
+            tokens.add(token)
+    # "Q1" and "H2" split into a letter and a number; keep the marker so Q1 2025 and H1 2025 differ
+    tokens.update(m.lower() for m in re.findall(r"\b[QH][1-4]\b", question, flags=re.IGNORECASE))
+    return frozenset(tokens)
+
+
+class SemanticQueryCache:
+    """
+    Small in-memory nearest-neighbour index over raw question embeddings that
+    maps a question to its preprocessing result (rewrite, date window and key
+    terms). Vectors are kept L2-normalized in a fixed-size matrix, so lookup is
+    one matrix-vector product; the oldest entry is overwritten when full.
+    Entries expire after `ttl` seconds or when the month changes, since
+    relative dates resolve against the current month.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES, ttl=SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = [None] * max_entries
+        self._next = 0
+        self._stats = {"hits": 0, "misses": 0, "guarded_misses": 0, "writes": 0}
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question, vector):
+        """Returns a copy of the cached preprocessing result, or None."""
+        if self._vectors is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        vector = self._normalize(vector)
+        tokens = temporal_tokens(question)
+        month = datetime.today().strftime("%Y-%m")
+        now = time.time()
+        with self._lock:
+            similarities = self._vectors @ vector
+            for index in np.argsort(-similarities):
+                if similarities[index] < self.threshold:
+                    break
+                entry = self._entries[index]
+                if entry is None or entry["expires_at"] < now or entry["month"] != month:
+                    continue
+                if entry["tokens"] != tokens:
+                    self._stats["guarded_misses"] += 1
+                    continue
+                self._stats["hits"] += 1
+                logging.info(f"Semantic cache hit ({similarities[index]:.3f}): {question!r} ~ {entry['question']!r}")
+                return copy.deepcopy(entry["value"])
+            self._stats["misses"] += 1
+        return None
+
+    def add(self, question, vector, value):
+        vector = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            index = self._next
+            self._next = (self._next + 1) % self.max_entries
+            self._vectors[index] = vector
+            self._entries[index] = {
+                "question": question,
+                "tokens": temporal_tokens(question),
+                "month": datetime.today().strftime("%Y-%m"),
+                "expires_at": time.time() + self.ttl,
+                "value": copy.deepcopy(value),
+            }
+            self._stats["writes"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = sum(entry is not None for entry in self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
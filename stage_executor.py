@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from deadline import call_deadline
+
+
+@dataclass
+class Stage:
+    """
+    One step of a request pipeline.
+
+    `fn` is called with the results of `deps` as positional arguments, in the
+    order they are listed. Optional stages that raise resolve to None instead of
+    failing the whole run, and every stage depending on them is skipped as well.
+    A stage with a `fallback` is called with the same arguments when `fn` fails
+    or times out, and its dependents then run on the fallback result.
+    `timeout` bounds the stage in seconds; a timeout counts as a failure. The
+    stage's expiry is available to `fn` as deadline.call_deadline.
+    """
+    name: str
+    fn: Callable
+    deps: Tuple[str, ...] = ()
+    optional: bool = False
+    timeout: Optional[float] = None
+    fallback: Optional[Callable] = None
+
+
+class StageResults(dict):
+    """Stage results by name, plus the names of stages that did not complete normally."""
+
+    def __init__(self):
+        super().__init__()
+        self.skipped: Set[str] = set()
+
+
+def _validate(stages: List[Stage]) -> None:
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate stage names in {names}")
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in names:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+
+async def _call(fn: Callable, args: list, executor) -> Any:
+    if asyncio.iscoroutinefunction(fn):
+        return await fn(*args)
+    loop = asyncio.get_running_loop()
+    # Executor threads do not inherit context variables, so call_deadline is passed explicitly
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, functools.partial(fn, *args))
+
+
+async def _run_stage(stage: Stage, args: list, executor, deadline: Optional[float]) -> Any:
+    timeout = stage.timeout
+    if deadline is not None:
+        remaining = deadline - time.time()
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    if timeout is None:
+        return await _call(stage.fn, args, executor)
+    if timeout <= 0:
+        raise asyncio.TimeoutError(f"no time left for stage {stage.name}")
+    # A synchronous stage keeps running in its thread after a timeout and its
+    # result is discarded; call_deadline lets it stop waiting on its own by then
+    call_deadline.set(time.time() + timeout)
+    return await asyncio.wait_for(_call(stage.fn, args, executor), timeout)
+
+
+async def run_stages(stages: List[Stage], executor=None, deadline: Optional[float] = None) -> StageResults:
+    """
+    Runs a dependency graph of stages, starting every stage whose dependencies
+    have resolved at the same time.
+
+    Args:
+        stages: Stages to run. Dependencies are referenced by stage name.
+        executor: concurrent.futures executor used for synchronous stage
+            functions. Defaults to the event loop's default executor.
+        deadline: Absolute time.time() by which every stage must finish. Stages
+            still running then time out, in addition to their own timeout.
+
+    Returns:
+        StageResults mapping each stage name to its result (None for skipped
+        stages). Its `skipped` attribute names every stage that failed, timed
+        out, fell back or was skipped because of a dependency.
+    """
+    _validate(stages)
+    results = StageResults()
+    skipped = set()
+    pending = {stage.name: stage for stage in stages}
+    running: Dict[asyncio.Task, Tuple[Stage, float]] = {}
+
+    try:
+        while pending or running:
+            ready = [name for name in pending if all(dep in results for dep in pending[name].deps)]
+            while ready:
+                for name in ready:
+                    stage = pending.pop(name)
+                    failed = [dep for dep in stage.deps if dep in skipped]
+                    if failed:
+                        # Resolve immediately so stages further down the chain are skipped too
+                        logging.warning(f"Skipping stage {name}: dependencies {failed} did not complete")
+                        results[name] = None
+                        skipped.add(name)
+                        continue
+                    args = [results[dep] for dep in stage.deps]
+                    task = asyncio.ensure_future(_run_stage(stage, args, executor, deadline))
+                    running[task] = (stage, time.time(), args)
+                ready = [name for name in pending if all(dep in results for dep in pending[name].deps)]
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle between stages {sorted(pending)}")
+                break
+
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage, stage_start, args = running.pop(task)
+                elapsed = time.time() - stage_start
+                try:
+                    results[stage.name] = task.result()
+                    logging.info(f"Stage {stage.name} completed in {elapsed:.4f} seconds")
+                except Exception as e:
+                    reason = "timed out" if isinstance(e, asyncio.TimeoutError) else "failed"
+                    if stage.fallback is not None:
+                        logging.warning(f"Stage {stage.name} {reason} after {elapsed:.4f} seconds, using fallback: {e}")
+                        results[stage.name] = stage.fallback(*args)
+                        results.skipped.add(stage.name)
+                        continue
+                    if not stage.optional:
+                        raise
+                    logging.warning(f"Optional stage {stage.name} {reason} after {elapsed:.4f} seconds: {e}")
+                    results[stage.name] = None
+                    skipped.add(stage.name)
+    finally:
+        for task in running:
+            task.cancel()
+
+    results.skipped.update(skipped)
+    return results
@@ -0,0 +1,102 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_queue_full_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_queue=1, queue_timeout=5)
+
+        async def request():
+            async with controller.admit():
+                await asyncio.sleep(0.05)
+            return "ok"
+
+        return await asyncio.gather(*(request() for _ in range(4)), return_exceptions=True), controller
+
+    results, controller = run(scenario())
+    rejected = [r for r in results if isinstance(r, AdmissionRejected)]
+    assert results.count("ok") == 3
+    assert len(rejected) == 1
+    assert rejected[0].retry_after >= 1
+    stats = controller.stats()
+    assert stats["rejected_queue_full"] == 1
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        slot = await controller.slot()
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        slot.release()
+        return controller.stats()
+
+    stats = run(scenario())
+    assert stats["rejected_timeout"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_slot_release_is_idempotent():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=0.05)
+        slot = await controller.slot()
+        slot.release()
+        slot.release()
+        # A double release would let two requests in at once
+        first = await controller.slot()
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        first.release()
+        return controller.stats()
+
+    assert run(scenario())["in_flight"] == 0
+
+
+def test_stream_closed_at_first_event_frees_its_slot():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        slot = await controller.slot()
+
+        async def events():
+            try:
+                yield "query"
+                yield "final"
+            finally:
+                slot.release()
+
+        stream = events()
+        await stream.__anext__()
+        await stream.aclose()
+        return controller.stats()
+
+    assert run(scenario())["in_flight"] == 0
+
+
+def test_never_started_stream_frees_its_slot_when_collected():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        slot = await controller.slot()
+
+        async def events():
+            try:
+                yield "query"
+            finally:
+                slot.release()
+
+        stream = events()
+        weakref.finalize(stream, slot.release)
+        del stream
+        gc.collect()
+        return controller.stats()
+
+    assert run(scenario())["in_flight"] == 0
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitBreakerOpen
+
+
+def make_breaker(probe=lambda: None, **kwargs):
+    options = {"window": 10.0, "min_calls": 4, "failure_rate": 0.5, "probe_interval": 0.01}
+    options.update(kwargs)
+    return CircuitBreaker("test", probe, **options)
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert not breaker.is_open
+    breaker.check("caller")
+
+
+def test_opens_at_failure_rate_and_rejects_calls():
+    breaker = make_breaker(probe=lambda: time.sleep(10))
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitBreakerOpen):
+        breaker.check("caller")
+    stats = breaker.stats()
+    assert stats["opened"] == 1 and stats["rejected"] == 1
+    assert stats["window_attempts"] == 4 and stats["window_failures"] == 2
+
+
+def test_mostly_successful_traffic_keeps_it_closed():
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_failures_outside_the_window_are_forgotten():
+    breaker = make_breaker(window=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.1)
+    breaker.record_failure()
+    assert not breaker.is_open
+    assert breaker.stats()["window_attempts"] == 1
+
+
+def test_probe_closes_it_once_the_dependency_recovers():
+    recovered = threading.Event()
+    calls = []
+
+    def probe():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("still down")
+        recovered.set()
+
+    breaker = make_breaker(probe=probe)
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.is_open
+    assert recovered.wait(2)
+    deadline = time.time() + 2
+    while breaker.is_open and time.time() < deadline:
+        time.sleep(0.01)
+    assert not breaker.is_open
+    breaker.check("caller")
+    assert breaker.stats()["probes"] >= 3
+    # Failures from before the outage do not reopen it on the next failure
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_custom_error_type():
+    class Unavailable(CircuitBreakerOpen):
+        pass
+
+    breaker = make_breaker(probe=lambda: time.sleep(10), error=Unavailable, min_calls=1)
+    breaker.record_failure()
+    with pytest.raises(Unavailable):
+        breaker.check("caller")
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+
+from date_parser import parse_date_range
+
+TODAY = datetime(2025, 8, 14)
+
+
+@pytest.mark.parametrize("query, expected", [
+    # Fiscal years run April to March and are named after the year they end in
+    ("CPI inflation in FY25", ("April 2024", "March 2025")),
+    ("CPI inflation in FY 2023-24", ("April 2023", "March 2024")),
+    ("CPI inflation in financial year 2022-23", ("April 2022", "March 2023")),
+    ("food inflation 2021-22", ("April 2021", "March 2022")),
+    # Halves and quarters of fiscal years
+    ("H1 FY25 inflation", ("April 2024", "September 2024")),
+    ("H2 of FY 2023-24", ("October 2023", "March 2024")),
+    ("Q1 FY24", ("April 2023", "June 2023")),
+    ("Q4 FY2024", ("January 2024", "March 2024")),
+    # Calendar-year quarters follow the same April-based convention
+    ("Q3 2022", ("October 2022", "December 2022")),
+    ("Q4 2022", ("January 2023", "March 2023")),
+    # Months
+    ("CPI for March 2024", ("March 2024", "March 2024")),
+    ("between Jan and Mar 2024", ("January 2024", "March 2024")),
+    ("Nov to Feb 2024", ("November 2023", "February 2024")),
+    ("since June 2024", ("June 2024", "August 2025")),
+    ("inflation in 2023", ("January 2023", "December 2023")),
+    ("CPI inflation 2023?", ("January 2023", "December 2023")),
+    ("compare 2022 and 2023", ("January 2022", "December 2023")),
+    ("since 2024", ("January 2024", "August 2025")),
+    ("latest CPI print", ("August 2025", "August 2025")),
+])
+def test_absolute_expressions(query, expected):
+    assert parse_date_range(query, today=TODAY) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    # Month and quarter ranges span exactly N units and end with the previous month
+    ("inflation over the last six months", ("February 2025", "July 2025")),
+    ("past 3 months", ("May 2025", "July 2025")),
+    ("last month", ("July 2025", "July 2025")),
+    ("CPI for the previous month", ("July 2025", "July 2025")),
+    ("last quarter", ("May 2025", "July 2025")),
+    ("previous two quarters", ("February 2025", "July 2025")),
+    # Year ranges run up to the current month
+    ("last year", ("September 2024", "August 2025")),
+    ("past 2 years", ("September 2023", "August 2025")),
+])
+def test_relative_ranges_span_exactly_n_months(query, expected):
+    assert parse_date_range(query, today=TODAY) == expected
+
+
+def test_multiple_expressions_take_the_outer_bounds():
+    assert parse_date_range("compare March 2023 with FY25", today=TODAY) == ("March 2023", "March 2025")
+
+
+def test_future_dates_are_capped_at_the_current_month():
+    assert parse_date_range("projections for FY27", today=TODAY) == ("August 2025", "August 2025")
+
+
+@pytest.mark.parametrize("query", [
+    "top 2000 companies in India",
+    "around 1990 households were surveyed",
+])
+def test_numbers_that_are_not_years_are_ignored(query):
+    assert parse_date_range(query, today=TODAY) is None
+
+
+def test_non_year_number_does_not_widen_a_range():
+    query = "top 2000 companies by CPI weight from January 2024 to July 2025"
+    assert parse_date_range(query, today=TODAY) == ("January 2024", "July 2025")
+
+
+def test_unrecognised_query_returns_none():
+    assert parse_date_range("what is the weight of cereals in the CPI basket", today=TODAY) is None
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import embedding_cache
+from embedding_cache import DiskTier, EmbeddingCache
+
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+
+def entry_size(key, dim=4):
+    return dim * 4 + len(key) + embedding_cache._ENTRY_OVERHEAD
+
+
+def test_memory_tier_evicts_least_recently_used_by_bytes():
+    cache = EmbeddingCache(max_bytes=2 * entry_size("a"), directory="")
+    cache.put("a", vector(1))
+    cache.put("b", vector(2))
+    assert cache.get("a") is not None
+    cache.put("c", vector(3))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_memory_tier_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    cache = EmbeddingCache(ttl=60, directory="")
+    cache.put("a", vector(1))
+    now[0] += 59
+    assert cache.get("a") is not None
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_tier_survives_a_new_cache_and_is_promoted(tmp_path):
+    EmbeddingCache(directory=str(tmp_path), disk_slots=64).put("a", vector(1))
+    cache = EmbeddingCache(directory=str(tmp_path), disk_slots=64)
+    np.testing.assert_array_equal(cache.get("a"), vector(1))
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_disk_tier_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    tier = DiskTier(str(tmp_path), 64, ttl=60)
+    tier.put("a", vector(1))
+    now[0] += 61
+    assert tier.get("a") is None
+
+
+def test_disk_tier_replaces_the_least_recently_used_way(tmp_path):
+    tier = DiskTier(str(tmp_path), embedding_cache._DISK_WAYS, ttl=3600)
+    keys = [f"k{i}" for i in range(embedding_cache._DISK_WAYS + 1)]
+    for i, key in enumerate(keys[:-1]):
+        tier.put(key, vector(i))
+    tier.get(keys[0])
+    tier.put(keys[-1], vector(99))
+    assert tier.get(keys[0]) is not None
+    assert tier.get(keys[1]) is None
+    np.testing.assert_array_equal(tier.get(keys[-1]), vector(99))
+
+
+def test_layout_change_replaces_the_file_instead_of_truncating_it(tmp_path):
+    first = DiskTier(str(tmp_path), 64, ttl=3600)
+    first.put("a", vector(1))
+    path = first._path()
+    old_inode = os.stat(path).st_ino
+    old_records = first._records
+
+    second = DiskTier(str(tmp_path), 64, ttl=3600)
+    second.put("b", vector(2, dim=8))
+    assert os.stat(path).st_ino != old_inode
+    # The old mapping is still fully readable: the file was never shrunk under it
+    assert old_records.shape == (64,)
+    assert np.array(old_records["vector"]).sum() == 4
+
+    # The first process notices the new file and uses it
+    assert first.get("a") is None
+    np.testing.assert_array_equal(first.get("b"), vector(2, dim=8))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def _create_and_put(directory, value):
+    tier = DiskTier(directory, 64, ttl=3600)
+    tier.put(f"key{value}", vector(value))
+    return os.stat(tier._path()).st_ino
+
+
+def test_concurrent_processes_create_the_file_once(tmp_path):
+    with ProcessPoolExecutor(4) as pool:
+        inodes = set(pool.map(_create_and_put, [str(tmp_path)] * 8, range(8)))
+    assert len(inodes) == 1
+    tier = DiskTier(str(tmp_path), 64, ttl=3600)
+    for value in range(8):
+        np.testing.assert_array_equal(tier.get(f"key{value}"), vector(value))
+
+
+class PausingRecords:
+    """Records of one DiskTier that pause the first time `field` is written during put."""
+
+    def __init__(self, records, field):
+        self.records = records
+        self.field = field
+        self.reached = threading.Event()
+        self.resume = threading.Event()
+
+    @property
+    def dtype(self):
+        return self.records.dtype
+
+    def __getitem__(self, field):
+        if field == self.field and not self.reached.is_set():
+            self.reached.set()
+            self.resume.wait(5)
+        return self.records[field]
+
+
+def test_interleaved_writers_never_pair_a_digest_with_another_keys_vector(tmp_path):
+    first = DiskTier(str(tmp_path), embedding_cache._DISK_WAYS, ttl=3600)
+    first._create(4)
+    second = DiskTier(str(tmp_path), embedding_cache._DISK_WAYS, ttl=3600)
+    # The first writer stops after clearing the digest, the second after writing its vector
+    first._records = PausingRecords(first._records, "vector")
+    second._records = PausingRecords(second._records, "created")
+
+    writer_a = threading.Thread(target=first.put, args=("a", vector(1)))
+    writer_b = threading.Thread(target=second.put, args=("b", vector(2)))
+    writer_a.start()
+    assert first._records.reached.wait(2)
+    writer_b.start()
+    second._records.reached.wait(0.2)
+    first._records.resume.set()
+    writer_a.join(5)
+    assert second._records.reached.wait(2)
+    second._records.resume.set()
+    writer_b.join(5)
+
+    reader = DiskTier(str(tmp_path), embedding_cache._DISK_WAYS, ttl=3600)
+    np.testing.assert_array_equal(reader.get("a"), vector(1))
+    np.testing.assert_array_equal(reader.get("b"), vector(2))
@@ -0,0 +1,60 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+import inference_backend
+
+MODEL_BYTES = b"x" * 1024 + b"complete"
+
+
+class FakeModel:
+    """Stands in for SentenceTransformer/CrossEncoder; loading an export checks it is complete."""
+
+    def __init__(self, name_or_path, backend="torch", device="cpu", model_kwargs=None):
+        self.path = name_or_path
+        if model_kwargs is not None:
+            with open(os.path.join(name_or_path, model_kwargs["file_name"]), "rb") as f:
+                assert f.read() == MODEL_BYTES
+
+    def save_pretrained(self, path):
+        with open(os.path.join(path, "config.json"), "w") as f:
+            f.write("{}")
+
+
+def slow_export(model, preset, export_dir):
+    os.makedirs(os.path.join(export_dir, "onnx"), exist_ok=True)
+    with open(os.path.join(export_dir, "onnx", f"model_qint8_{preset}.onnx"), "wb") as f:
+        for start in range(0, len(MODEL_BYTES), 256):
+            f.write(MODEL_BYTES[start:start + 256])
+            f.flush()
+            time.sleep(0.02)
+    with open(os.path.join(inference_backend.ONNX_MODEL_DIR, "exports.log"), "a") as log:
+        log.write("export\n")
+
+
+def load_in_worker(_):
+    return inference_backend._load(FakeModel, "org/model", "onnx").path
+
+
+def test_concurrent_loads_export_once_and_never_see_a_partial_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_backend, "ONNX_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(sentence_transformers, "export_dynamic_quantized_onnx_model", slow_export)
+    with ProcessPoolExecutor(4) as pool:
+        paths = set(pool.map(load_in_worker, range(4)))
+    assert paths == {inference_backend._export_dir("org/model")}
+    assert (tmp_path / "exports.log").read_text() == "export\n"
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".export-")]
+
+
+def test_export_command_replaces_an_existing_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_backend, "ONNX_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(sentence_transformers, "export_dynamic_quantized_onnx_model", slow_export)
+    export_dir = inference_backend.export_quantized_onnx(FakeModel, "org/model")
+    inference_backend.export_quantized_onnx(FakeModel, "org/model")
+    assert (tmp_path / "exports.log").read_text() == "export\nexport\n"
+    FakeModel(export_dir, model_kwargs={"file_name": inference_backend._quantized_file()})
+    assert sorted(name for name in os.listdir(tmp_path) if not name.startswith(".")) == ["exports.log", "org__model"]
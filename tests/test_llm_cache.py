@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import llm_cache
+
+
+class Config(SimpleNamespace):
+    def model_dump(self, exclude_none=False):
+        return {k: v for k, v in vars(self).items() if v is not None or not exclude_none}
+
+
+def ts(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm_cache._local, "conn", None, raising=False)
+    yield llm_cache
+    llm_cache._local.conn.close()
+    llm_cache._local.conn = None
+
+
+def test_expiry_without_current_month_uses_ttl(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL", 3600)
+    now = ts(2025, 5, 31, 23, 30)
+    assert llm_cache.expiry_for(Config(system_instruction="Answer briefly."), now) == now + 3600
+
+
+def test_expiry_with_current_month_stops_at_the_rollover(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL", 7 * 24 * 3600)
+    now = ts(2025, 5, 30, 12)
+    config = Config(system_instruction="Today is 2025-05. Resolve relative dates against it.")
+    assert llm_cache.expiry_for(config, now) == ts(2025, 6, 1)
+
+
+def test_expiry_rolls_over_into_the_next_year(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL", 7 * 24 * 3600)
+    now = ts(2025, 12, 31, 12)
+    assert llm_cache.expiry_for(Config(system_instruction="curdate 2025-12"), now) == ts(2026, 1, 1)
+
+
+def test_only_deterministic_calls_are_cacheable():
+    assert llm_cache.is_cacheable(Config(temperature=0.0))
+    assert not llm_cache.is_cacheable(Config(temperature=0.7))
+
+
+def test_key_depends_on_model_config_and_contents():
+    config = Config(temperature=0.0, system_instruction="a")
+    key = llm_cache.make_key("m", config, "q")
+    assert key == llm_cache.make_key("m", Config(temperature=0.0, system_instruction="a"), "q")
+    assert key != llm_cache.make_key("other", config, "q")
+    assert key != llm_cache.make_key("m", Config(temperature=0.0, system_instruction="b"), "q")
+    assert key != llm_cache.make_key("m", config, "q2")
+
+
+def test_expired_entries_are_not_served(cache):
+    now = time.time()
+    cache.put("fresh", "helper", "answer", now + 60)
+    cache.put("stale", "helper", "old answer", now - 1)
+    assert cache.get("fresh") == "answer"
+    assert cache.get("stale") is None
+
+
+def test_prune_drops_expired_then_least_recently_used(cache, monkeypatch):
+    monkeypatch.setattr(cache, "LLM_CACHE_MAX_ENTRIES", 2)
+    now = time.time()
+    cache.put("expired", "helper", "x", now - 1)
+    for key in ("a", "b", "c"):
+        cache.put(key, "helper", key, now + 60)
+    cache.get("a")
+    conn = cache._connection()
+    cache.prune(conn, time.time())
+    keys = {row[0] for row in conn.execute("SELECT key FROM llm_cache")}
+    assert keys == {"a", "c"}
@@ -0,0 +1,53 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+import llm_gateway
+from circuit_breaker import CircuitBreaker
+from deadline import call_deadline
+from google.genai import types
+
+
+class TimingOutClient:
+    def __init__(self):
+        self.timeouts = []
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model, config, contents):
+        self.timeouts.append(config.http_options.timeout if config.http_options else None)
+        raise TimeoutError("timed out")
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    client = TimingOutClient()
+    monkeypatch.setattr(llm_gateway, "get_client", lambda: client)
+    monkeypatch.setattr(llm_gateway, "_backoff", lambda attempt: 0.0)
+    monkeypatch.setattr(llm_gateway, "breaker", CircuitBreaker("test", lambda: time.sleep(10), min_calls=2, failure_rate=0.5))
+    return client
+
+
+def call():
+    llm_gateway.generate_content("test", "model", types.GenerateContentConfig(temperature=0.0), "question")
+
+
+def test_budget_cut_timeouts_never_open_the_breaker(gateway):
+    for _ in range(20):
+        token = call_deadline.set(time.time() + 1)
+        try:
+            with pytest.raises(TimeoutError):
+                call()
+        finally:
+            call_deadline.reset(token)
+    assert gateway.timeouts and all(timeout <= 1000 for timeout in gateway.timeouts)
+    assert not llm_gateway.breaker.is_open
+    assert llm_gateway.breaker.stats()["window_failures"] == 0
+
+
+def test_timeouts_after_the_full_llm_timeout_open_the_breaker(gateway):
+    with pytest.raises(TimeoutError):
+        call()
+    assert llm_gateway.breaker.is_open
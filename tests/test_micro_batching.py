@@ -0,0 +1,54 @@
+import asyncio
+
+from micro_batching import MicroBatcher
+
+
+def test_large_submission_is_chunked_at_max_batch_size():
+    batches = []
+
+    def batch_fn(inputs):
+        batches.append(len(inputs))
+        return [x * 2 for x in inputs]
+
+    async def scenario():
+        batcher = MicroBatcher("test", batch_fn, max_batch_size=4, max_wait_ms=1)
+        return await batcher.submit(range(10))
+
+    assert asyncio.run(scenario()) == [x * 2 for x in range(10)]
+    assert batches == [4, 4, 2]
+
+
+def test_concurrent_submissions_share_a_batch_and_get_their_own_outputs():
+    batches = []
+
+    def batch_fn(inputs):
+        batches.append(list(inputs))
+        return [x + 100 for x in inputs]
+
+    async def scenario():
+        batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait_ms=20)
+        return await asyncio.gather(batcher.submit([1, 2]), batcher.submit([3]), batcher.submit([4, 5, 6]))
+
+    assert asyncio.run(scenario()) == [[101, 102], [103], [104, 105, 106]]
+    assert batches == [[1, 2, 3, 4, 5, 6]]
+
+
+def test_small_request_interleaves_with_a_large_one():
+    batches = []
+
+    def batch_fn(inputs):
+        batches.append(list(inputs))
+        return inputs
+
+    async def scenario():
+        batcher = MicroBatcher("test", batch_fn, max_batch_size=4, max_wait_ms=1)
+        large = asyncio.ensure_future(batcher.submit(range(12)))
+        await asyncio.sleep(0)
+        small = await batcher.submit(["q"])
+        return await large, small
+
+    large, small = asyncio.run(scenario())
+    assert large == list(range(12)) and small == ["q"]
+    small_batch = next(i for i, b in enumerate(batches) if "q" in b)
+    last_large_batch = next(i for i, b in enumerate(batches) if 11 in b)
+    assert small_batch < last_large_batch
@@ -0,0 +1,34 @@
+import logging
+
+import pytest
+
+from prefork_server import _reset_logging
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_worker_can_apply_the_apps_logging_config(root_logger, tmp_path):
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    # What the master configures before forking
+    logging.basicConfig(level=logging.INFO)
+    _reset_logging()
+    # What the app module does when a worker imports it
+    log_file = tmp_path / "app.log"
+    logging.basicConfig(filename=str(log_file), level=logging.DEBUG)
+    logging.debug("worker debug message")
+    for handler in root_logger.handlers:
+        handler.flush()
+    assert root_logger.level == logging.DEBUG
+    assert "worker debug message" in log_file.read_text()
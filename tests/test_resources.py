@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+
+from resources import ResourceRegistry, cached_resource, registry
+
+
+def test_factory_runs_once_under_concurrent_first_use():
+    local = ResourceRegistry()
+    calls = []
+
+    def factory():
+        time.sleep(0.05)
+        calls.append(1)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(local.get("model", factory))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert local.stats()["model"]["initialized"] == 1
+
+
+def test_shutdown_closes_newest_first_and_allows_rebuild():
+    local = ResourceRegistry()
+    closed = []
+    builds = []
+
+    def build_a():
+        builds.append("a")
+        return "A"
+
+    local.get("a", build_a, close=closed.append)
+    local.get("b", lambda: "B", close=closed.append)
+
+    local.shutdown()
+
+    assert closed == ["B", "A"]
+    assert local.stats()["a"]["initialized"] == 0
+    assert local.get("a", build_a) == "A"
+    assert builds == ["a", "a"]
+
+
+def test_cached_resource_never_exposes_arguments(caplog):
+    @cached_resource()
+    def make_client(uri, token=None):
+        return object()
+
+    with caplog.at_level(logging.INFO):
+        first = make_client("http://milvus", token="root:SECRET")
+        second = make_client("http://milvus", token="root:SECRET")
+        other = make_client("http://milvus", token="root:OTHER")
+
+    assert first is second
+    assert other is not first
+    assert "SECRET" not in caplog.text
+    assert "SECRET" not in repr(registry.stats())
+    assert registry.stats()[make_client.__module__ + ".test_cached_resource_never_exposes_arguments.<locals>.make_client"]["instances"] == 2
@@ -0,0 +1,75 @@
+import response_cache
+from response_cache import ResponseCache, normalize_question
+
+
+def test_normalize_question_ignores_case_punctuation_and_spacing():
+    assert normalize_question("  What was CPI inflation,  in FY25? ") == "what was cpi inflation in fy25"
+
+
+def test_equivalent_questions_share_an_entry():
+    cache = ResponseCache()
+    cache.put("What was CPI in May 2024?", {"results": [1]})
+    assert cache.get("what was cpi in may 2024") == {"results": [1]}
+
+
+def test_returned_responses_are_copies():
+    cache = ResponseCache()
+    response = {"results": [1]}
+    cache.put("q", response)
+    response["results"].append(2)
+    cache.get("q")["results"].append(3)
+    assert cache.get("q") == {"results": [1]}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(ttl=60)
+    cache.put("q", {"results": []})
+    now[0] += 59
+    assert cache.get("q") is not None
+    now[0] += 2
+    assert cache.get("q") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")
+    cache.put("c", {"id": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_version_change_drops_entries_and_stale_writes():
+    cache = ResponseCache()
+    cache.set_version("v1")
+    cache.put("q", {"results": []}, version="v1")
+    assert cache.get("q") is not None
+    cache.set_version("v2")
+    assert cache.get("q") is None
+    # A request that started before the change must not repopulate the cache
+    cache.put("q", {"results": []}, version="v1")
+    assert cache.get("q") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_entries_are_keyed_by_month(monkeypatch):
+    class Month:
+        value = "2025-05"
+
+        @classmethod
+        def today(cls):
+            return cls
+
+        @classmethod
+        def strftime(cls, fmt):
+            return cls.value
+
+    monkeypatch.setattr(response_cache, "datetime", Month)
+    cache = ResponseCache()
+    cache.put("latest cpi", {"month": "May"})
+    Month.value = "2025-06"
+    assert cache.get("latest cpi") is None
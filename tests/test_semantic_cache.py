@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import semantic_cache
+from semantic_cache import SemanticQueryCache, temporal_tokens
+
+VECTOR = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+PLAN = {"llm_query": "CPI inflation", "key_terms": ["cpi"]}
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("CPI June 2025", "CPI July 2025"),
+    ("CPI FY25", "CPI FY26"),
+    ("CPI Q1 2025", "CPI H1 2025"),
+    ("CPI 2024", "CPI 2025"),
+    ("CPI last 6 months", "CPI last 3 months"),
+    ("latest CPI", "CPI"),
+])
+def test_different_temporal_tokens_are_guarded_misses(cached, asked):
+    cache = SemanticQueryCache(threshold=0.9)
+    cache.add(cached, VECTOR, PLAN)
+    # Identical vectors: only the temporal guard can keep these apart
+    assert cache.lookup(asked, VECTOR) is None
+    stats = cache.stats()
+    assert stats["guarded_misses"] == 1 and stats["hits"] == 0
+
+
+def test_month_abbreviations_and_case_match_full_names():
+    assert temporal_tokens("CPI for Jun 2025") == temporal_tokens("cpi for JUNE 2025")
+    assert temporal_tokens("CPI Q1 2025") != temporal_tokens("CPI H1 2025")
+
+
+def test_similar_question_with_the_same_dates_is_a_hit():
+    cache = SemanticQueryCache(threshold=0.9)
+    cache.add("What was CPI inflation in June 2025?", VECTOR, PLAN)
+    result = cache.lookup("CPI inflation for June 2025", np.array([0.95, 0.1, 0.0]))
+    assert result == PLAN
+    result["key_terms"].append("mutated")
+    assert cache.lookup("CPI inflation for June 2025", VECTOR) == PLAN
+
+
+def test_entries_below_the_threshold_are_not_returned():
+    cache = SemanticQueryCache(threshold=0.9)
+    cache.add("CPI June 2025", VECTOR, PLAN)
+    assert cache.lookup("CPI June 2025", np.array([0.5, 0.5, 0.0])) is None
+    assert cache.stats()["guarded_misses"] == 0
+
+
+def test_expired_entries_are_not_returned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = SemanticQueryCache(threshold=0.9, ttl=60)
+    cache.add("CPI June 2025", VECTOR, PLAN)
+    now[0] += 61
+    assert cache.lookup("CPI June 2025", VECTOR) is None
+
+
+def test_entries_from_the_previous_month_are_not_returned(monkeypatch):
+    class Month:
+        value = "2025-06"
+
+        @classmethod
+        def today(cls):
+            return cls
+
+        @classmethod
+        def strftime(cls, fmt):
+            return cls.value
+
+    monkeypatch.setattr(semantic_cache, "datetime", Month)
+    cache = SemanticQueryCache(threshold=0.9)
+    cache.add("latest CPI", VECTOR, PLAN)
+    assert cache.lookup("latest CPI", VECTOR) == PLAN
+    Month.value = "2025-07"
+    assert cache.lookup("latest CPI", VECTOR) is None
+
+
+def test_oldest_entry_is_overwritten_when_full():
+    cache = SemanticQueryCache(threshold=0.9, max_entries=2)
+    cache.add("CPI June 2025", np.array([1.0, 0.0, 0.0]), {"n": 1})
+    cache.add("CPI July 2025", np.array([0.0, 1.0, 0.0]), {"n": 2})
+    cache.add("CPI August 2025", np.array([0.0, 0.0, 1.0]), {"n": 3})
+    assert cache.lookup("CPI June 2025", np.array([1.0, 0.0, 0.0])) is None
+    assert cache.lookup("CPI August 2025", np.array([0.0, 0.0, 1.0])) == {"n": 3}
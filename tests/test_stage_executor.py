@@ -0,0 +1,96 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from deadline import call_budget, call_deadline
+from stage_executor import Stage, run_stages
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_dependencies_receive_results_in_order():
+    results = run(run_stages([
+        Stage("a", lambda: 2),
+        Stage("b", lambda: 3),
+        Stage("c", lambda a, b: a * 10 + b, deps=("a", "b")),
+    ]))
+    assert results["c"] == 23
+    assert results.skipped == set()
+
+
+def test_failed_optional_stage_skips_its_dependents():
+    def boom():
+        raise RuntimeError("boom")
+
+    results = run(run_stages([
+        Stage("a", boom, optional=True),
+        Stage("b", lambda a: a, deps=("a",), optional=True),
+        Stage("c", lambda: "ok"),
+    ]))
+    assert results["a"] is None and results["b"] is None
+    assert results["c"] == "ok"
+    assert results.skipped == {"a", "b"}
+
+
+def test_failed_required_stage_raises():
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run(run_stages([Stage("a", boom)]))
+
+
+def test_timeout_uses_fallback_and_dependents_run_on_it():
+    results = run(run_stages([
+        Stage("slow", lambda: time.sleep(0.5) or "late", timeout=0.05, fallback=lambda: "fallback"),
+        Stage("next", lambda slow: slow.upper(), deps=("slow",)),
+    ]))
+    assert results["slow"] == "fallback"
+    assert results["next"] == "FALLBACK"
+    assert results.skipped == {"slow"}
+
+
+def test_request_deadline_cuts_stage_timeouts():
+    async def scenario():
+        start = time.time()
+        results = await run_stages(
+            [Stage("slow", lambda: time.sleep(0.5), optional=True, timeout=10)],
+            deadline=time.time() + 0.05,
+        )
+        return results, time.time() - start
+
+    results, elapsed = run(scenario())
+    assert elapsed < 0.4
+    assert results.skipped == {"slow"}
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        run(run_stages([Stage("a", lambda b: b, deps=("b",))]))
+
+
+def test_sync_stage_sees_its_budget_in_the_executor_thread():
+    budgets = {}
+
+    def stage():
+        budgets["budget"] = call_budget()
+
+    with ThreadPoolExecutor(1) as executor:
+        run(run_stages([Stage("a", stage, timeout=5)], executor=executor))
+    assert 4 < budgets["budget"] <= 5
+    # The stage's deadline does not leak into the caller's context
+    assert call_deadline.get() is None
+
+
+def test_stage_without_timeout_has_no_budget():
+    budgets = {}
+
+    def stage():
+        budgets["budget"] = call_budget()
+
+    run(run_stages([Stage("a", stage)]))
+    assert budgets["budget"] is None